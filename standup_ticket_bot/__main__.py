@@ -0,0 +1,7 @@
+# python -m standup_ticket_bot <команда> — см. standup_ticket_bot/cli.py
+import sys
+
+from standup_ticket_bot.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+# standup_ticket_bot/archive.py
+"""Архивация прошедших концертов.
+
+Концерты старше ARCHIVE_AFTER_DAYS переносятся из concerts в
+concerts_archive, чтобы «горячая» таблица (списки, upsert) не росла год
+от года. История остаётся доступной: /export с past/all читает обе таблицы.
+"""
+
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+
+from standup_ticket_bot.database import AsyncSessionLocal
+from standup_ticket_bot.concert_repository import archive_concerts
+
+# Через сколько дней после даты концерт уходит в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+
+
+async def archive_old_concerts() -> int:
+    """Переносит старые концерты в архив; ошибки печатает, но не бросает."""
+    before = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    try:
+        async with AsyncSessionLocal() as session:
+            moved = await archive_concerts(session, before)
+    except Exception as e:
+        print("‼️  Ошибка архивации концертов:", e)
+        return 0
+    if moved:
+        print(f"🗄  В архив перенесено концертов: {moved} (старше {before:%Y-%m-%d})")
+    return moved
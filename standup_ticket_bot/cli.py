@@ -0,0 +1,261 @@
+# standup_ticket_bot/cli.py
+"""Командная строка бота — разовые операции без запуска Telegram.
+
+    python -m standup_ticket_bot refresh
+    python -m standup_ticket_bot refresh --source timepad --dry-run
+    python -m standup_ticket_bot refresh --profile --report profile.txt
+    python -m standup_ticket_bot archive
+    python -m standup_ticket_bot bench --database-url sqlite+aiosqlite:///:memory:
+
+refresh   — один цикл загрузки из источников (как /refresh в боте).
+--dry-run — только скачать и распарсить, в БД ничего не писать.
+--profile — прогнать цикл под cProfile + tracemalloc и записать отчёт
+            с самыми «горячими» функциями, крупнейшими аллокациями
+            и самыми медленными HTTP-запросами.
+archive   — перенести старые концерты в concerts_archive (см. archive.py).
+bench     — замерить операции репозитория (upsert, выборки, выгрузка,
+            индекс, архивация) на синтетических концертах против любой БД
+            (Postgres или SQLite) — без токенов бота и источников.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import delete
+
+from standup_ticket_bot import database, http_client
+from standup_ticket_bot.cutoff import drop_past_events
+from standup_ticket_bot.database import init_db
+from standup_ticket_bot.models.concert import Concert, ConcertArchive, SourceEnum
+
+# parsers/ingest импортируются лениво: им нужны учётные данные источников,
+# а bench и archive должны работать без них
+
+
+def _select_sources(names: Optional[Sequence[str]]) -> list[SourceEnum]:
+    if not names:
+        return list(SourceEnum)
+    return [SourceEnum[n.upper()] for n in names]
+
+
+async def _refresh(sources: list[SourceEnum], dry_run: bool) -> bool:
+    from standup_ticket_bot.ingest import refresh_sources
+    from standup_ticket_bot.parsers import PARSERS_BY_SOURCE
+
+    try:
+        if dry_run:
+            for source in sources:
+                started = time.perf_counter()
+                events = await PARSERS_BY_SOURCE[source]()
+                took = time.perf_counter() - started
+                http_client.discard(source.value)   # dry-run ничего не сохраняет
+                if events is None:
+                    print(f"{source.value}: без изменений за {took:.2f} с (dry-run)")
+                else:
+                    events = drop_past_events(events)
+                    print(f"{source.value}: {len(events)} событий за {took:.2f} с (dry-run)")
+            return True
+
+        await init_db()
+        results = await refresh_sources(sources)
+        return all(r.ok for r in results)
+    finally:
+        await http_client.close_sessions()
+
+
+def _profile_report(profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot,
+                    peak: int, top: int, timings: list[http_client.RequestTiming]) -> str:
+    out = io.StringIO()
+    out.write(f"=== cProfile: топ-{top} функций по cumulative time ===\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    out.write(f"=== cProfile: топ-{top} функций по собственному времени ===\n")
+    pstats.Stats(profiler, stream=out).sort_stats("tottime").print_stats(top)
+
+    out.write(f"=== tracemalloc: пик {peak / 1024 / 1024:.1f} MiB, "
+              f"топ-{top} мест аллокаций (живые на конец цикла) ===\n")
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    for stat in snapshot.statistics("lineno")[:top]:
+        out.write(f"{stat}\n")
+
+    out.write(f"=== HTTP: {len(timings)} запросов, топ-{top} самых медленных (мс) ===\n")
+    for t in sorted(timings, key=lambda t: t.total_ms or 0, reverse=True)[:top]:
+        out.write(f"{t.total_ms!s:>9} total  dns={t.dns_ms} connect={t.connect_ms} "
+                  f"ttfb={t.ttfb_ms}  {t.status} {t.source} {t.method} {t.url}\n")
+    return out.getvalue()
+
+
+def cmd_refresh(args: argparse.Namespace) -> int:
+    coro = _refresh(_select_sources(args.source), dry_run=args.dry_run)
+
+    if not args.profile:
+        return 0 if asyncio.run(coro) else 1
+
+    # Тайминги запросов (DNS / connect / TTFB) тоже попадают в отчёт
+    http_client.HTTP_TRACE = True
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        ok = asyncio.run(coro)
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    report = _profile_report(profiler, snapshot, peak, args.top, http_client.recent_timings())
+    if args.report == "-":
+        sys.stdout.write(report)
+    else:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            fh.write(report)
+        print(f"Отчёт профилирования записан в {args.report}")
+    return 0 if ok else 1
+
+
+def cmd_archive(args: argparse.Namespace) -> int:
+    from standup_ticket_bot.archive import archive_old_concerts
+
+    async def _run() -> None:
+        await init_db()
+        moved = await archive_old_concerts()
+        print(f"Перенесено в архив: {moved}")
+
+    asyncio.run(_run())
+    return 0
+
+
+BENCH_PREFIX = "bench-"
+
+
+def _bench_events(n: int, round_no: int) -> list[dict]:
+    """Синтетические будущие концерты; в каждом раунде растут продажи."""
+    now = datetime.utcnow()
+    sources = list(SourceEnum)
+    return [
+        {
+            "external_id": f"{BENCH_PREFIX}{i}",
+            "name": f"Bench show {i}",
+            "date": now + timedelta(days=1 + i % 60, hours=i % 24),
+            "tickets_sold": min(10 * round_no + i % 50, 300),
+            "tickets_total": 300,
+            "source": sources[i % len(sources)],
+            "url": f"https://example.com/{BENCH_PREFIX}{i}",
+            "city": ("Москва", "Санкт-Петербург", "Казань")[i % 3],
+            "org_id": None,
+        }
+        for i in range(n)
+    ]
+
+
+async def _bench(url: str, n: int, rounds: int) -> None:
+    from standup_ticket_bot import concert_index
+    from standup_ticket_bot.concert_repository import (
+        archive_concerts, list_concerts, stream_concerts, upsert_events,
+    )
+
+    database.configure(url, echo=False)
+    await init_db()
+    Session = database.AsyncSessionLocal
+
+    async def timed(label: str, coro) -> None:
+        started = time.perf_counter()
+        result = await coro
+        took = time.perf_counter() - started
+        print(f"{label:<28} {took * 1000:9.1f} мс  ({result})")
+
+    async def upsert(round_no: int) -> int:
+        async with Session() as session:
+            count = await upsert_events(session, _bench_events(n, round_no))
+            await session.commit()
+        return count
+
+    async def select_all() -> int:
+        async with Session() as session:
+            return len(await list_concerts(session))
+
+    async def export_all() -> int:
+        async with Session() as session:
+            return sum([1 async for _ in stream_concerts(session, when="all")])
+
+    async def archive_all() -> int:
+        # Только свои строки: в рабочей БД настоящие концерты трогать нельзя
+        async with Session() as session:
+            return await archive_concerts(
+                session,
+                before=datetime.utcnow() + timedelta(days=365),
+                external_id_like=f"{BENCH_PREFIX}%",
+            )
+
+    print(f"bench: {database.engine.dialect.name}, {n} концертов, раундов: {rounds}")
+    try:
+        for round_no in range(rounds):
+            label = "upsert (вставка)" if round_no == 0 else f"upsert (обновление #{round_no})"
+            await timed(label, upsert(round_no))
+        await timed("list_concerts", select_all())
+        await timed("stream_concerts (all)", export_all())
+        await timed("concert_index.rebuild", concert_index.rebuild())
+        await timed("archive_concerts", archive_all())
+    finally:
+        # Подчищаем за собой — bench можно запускать и против рабочей БД
+        async with Session() as session:
+            for model in (Concert, ConcertArchive):
+                await session.execute(
+                    delete(model)
+                    .where(model.external_id.like(f"{BENCH_PREFIX}%"))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+        await database.engine.dispose()
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    asyncio.run(_bench(args.database_url, args.events, args.rounds))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m standup_ticket_bot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    refresh = sub.add_parser("refresh", help="один цикл загрузки концертов из источников")
+    refresh.add_argument(
+        "--source", action="append", choices=[s.value.lower() for s in SourceEnum],
+        help="источник (можно несколько раз); по умолчанию — все",
+    )
+    refresh.add_argument("--dry-run", action="store_true", help="не писать в БД")
+    refresh.add_argument("--profile", action="store_true", help="cProfile + tracemalloc")
+    refresh.add_argument("--report", default="-", help="куда писать отчёт профилирования (- = stdout)")
+    refresh.add_argument("--top", type=int, default=25, help="сколько строк в каждом разделе отчёта")
+    refresh.set_defaults(func=cmd_refresh)
+
+    archive = sub.add_parser("archive", help="перенести прошедшие концерты в архив")
+    archive.set_defaults(func=cmd_archive)
+
+    bench = sub.add_parser("bench", help="замер операций репозитория на синтетических данных")
+    bench.add_argument(
+        "--database-url", default="sqlite+aiosqlite:///:memory:",
+        help="БД для замера (по умолчанию — SQLite в памяти), например postgresql+asyncpg://...",
+    )
+    bench.add_argument("--events", type=int, default=2000, help="сколько концертов")
+    bench.add_argument("--rounds", type=int, default=3, help="раундов upsert (первый — вставка)")
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
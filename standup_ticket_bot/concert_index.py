@@ -0,0 +1,97 @@
+# standup_ticket_bot/concert_index.py
+"""In-memory индекс будущих концертов для inline-режима.
+
+Индекс пересобирается после каждого обновления данных (ingest) — inline-
+запросы (@bot <текст>) отвечают из памяти, без запроса в БД на каждое
+нажатие клавиши. При пересборке одним векторным проходом считается
+прогноз итоговых продаж (forecast.project_sold) для всех концертов.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from standup_ticket_bot.database import AsyncSessionLocal
+from standup_ticket_bot.concert_repository import list_concerts
+from standup_ticket_bot.forecast import project_sold
+from standup_ticket_bot.models.concert import SourceEnum
+
+
+@dataclass(frozen=True)
+class IndexedConcert:
+    """Снимок концерта: те же поля, что использует форматирование в handler.py."""
+    id: int
+    name: str
+    date: datetime
+    source: SourceEnum
+    city: Optional[str]
+    tickets_sold: int
+    tickets_total: int
+    projected: Optional[int]    # прогноз итоговых продаж (None — мало данных)
+    search_text: str            # name + city в нижнем регистре
+
+
+# Отсортирован по дате; заменяется целиком, поэтому читать можно без блокировок
+_concerts: tuple[IndexedConcert, ...] = ()
+_projected: dict[int, int] = {}
+built_at: Optional[datetime] = None
+
+
+async def rebuild() -> int:
+    """Перечитывает будущие концерты из БД; возвращает размер индекса."""
+    global _concerts, _projected, built_at
+    async with AsyncSessionLocal() as session:
+        rows = await list_concerts(session, days_ahead=None)
+
+    projected = project_sold(
+        [c.sales_history for c in rows],
+        [c.date for c in rows],
+        [c.tickets_sold for c in rows],
+        [c.tickets_total for c in rows],
+    )
+    proj = [None if np.isnan(p) else int(round(p)) for p in projected]
+
+    _concerts = tuple(
+        IndexedConcert(
+            id=c.id,
+            name=c.name,
+            date=c.date,
+            source=c.source,
+            city=c.city,
+            tickets_sold=c.tickets_sold,
+            tickets_total=c.tickets_total,
+            projected=p,
+            search_text=f"{c.name} {c.city or ''}".lower(),
+        )
+        for c, p in zip(rows, proj)
+    )
+    _projected = {c.id: c.projected for c in _concerts if c.projected is not None}
+    built_at = datetime.utcnow()
+    return len(_concerts)
+
+
+def projected_sold(concert_id: int) -> Optional[int]:
+    """Прогноз итоговых продаж концерта по последней пересборке индекса."""
+    return _projected.get(concert_id)
+
+
+def search(query: str, limit: int = 50) -> list[IndexedConcert]:
+    """
+    Ближайшие будущие концерты, в названии/городе которых есть все слова query.
+    Пустой query — просто ближайшие концерты.
+    """
+    words = query.lower().split()
+    now = datetime.utcnow()
+    found: list[IndexedConcert] = []
+    for c in _concerts:
+        if c.date < now:
+            continue
+        if all(w in c.search_text for w in words):
+            found.append(c)
+            if len(found) >= limit:
+                break
+    return found
@@ -1,20 +1,24 @@
-import inspect
 from datetime import datetime, timedelta
-from typing import Optional, Callable
+from typing import Optional, AsyncIterator, Any, Iterable
 
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from standup_ticket_bot.models.concert import Concert
+from standup_ticket_bot.models.concert import Concert, ConcertArchive, SourceEnum
+from standup_ticket_bot.models.sync_state import SyncState
+from standup_ticket_bot.forecast import append_observation
+from standup_ticket_bot.cutoff import drop_past_events, upcoming_cutoff
 
 
 async def list_concerts(
         session: AsyncSession,
-        days_ahead: Optional[int] = None
+        days_ahead: Optional[int] = None,
+        city: Optional[str] = None,
 ) -> list[Concert]:
     """
     Если days_ahead задан, возвращает концерты с датой >= now и <= now+days_ahead.
     Если days_ahead is None, возвращает **только будущие** концерты.
+    Если задан city — только концерты этого города.
     """
     now = datetime.utcnow()
 
@@ -33,49 +37,249 @@ async def list_concerts(
             .order_by(Concert.date)
         )
 
+    if city is not None:
+        stmt = stmt.where(Concert.city == city)
+
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
-async def upsert_concert(
+# Колонки выгрузки /export (порядок = порядок колонок CSV)
+EXPORT_COLUMNS = (
+    "date",
+    "name",
+    "source",
+    "city",
+    "org_id",
+    "tickets_sold",
+    "tickets_total",
+    "external_id",
+    "url",
+)
+
+
+async def stream_concerts(
         session: AsyncSession,
-        *parsers: Callable[..., list[dict]]
-) -> None:
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        source: Optional[SourceEnum] = None,
+        when: str = "future",
+        batch_size: int = 500,
+) -> AsyncIterator[tuple[Any, ...]]:
+    """
+    Потоково отдаёт строки EXPORT_COLUMNS по дате — через server-side cursor
+    (AsyncSession.stream + yield_per), без загрузки всей таблицы в память
+    и без ORM-объектов.
+    when: "future" — только будущие, "past" — только прошедшие, "all" — все.
+    Прошедшие концерты берутся и из concerts, и из concerts_archive.
+    """
+    now = datetime.utcnow()
+    tables = (Concert,) if when == "future" else (Concert, ConcertArchive)
+
+    selects = []
+    for model in tables:
+        stmt = select(*(getattr(model, c) for c in EXPORT_COLUMNS))
+        if when == "future":
+            stmt = stmt.where(model.date >= now)
+        elif when == "past":
+            stmt = stmt.where(model.date < now)
+        if date_from is not None:
+            stmt = stmt.where(model.date >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(model.date < date_to)
+        if source is not None:
+            stmt = stmt.where(model.source == source)
+        selects.append(stmt)
+
+    if len(selects) == 1:
+        stmt = selects[0].order_by(Concert.date)
+    else:
+        u = union_all(*selects).subquery()
+        stmt = select(*(u.c[c] for c in EXPORT_COLUMNS)).order_by(u.c.date)
+
+    result = await session.stream(stmt.execution_options(yield_per=batch_size))
+    async for partition in result.partitions(batch_size):
+        for row in partition:
+            yield tuple(row)
+
+
+async def archive_concerts(
+        session: AsyncSession,
+        before: datetime,
+        batch_size: int = 1000,
+        external_id_like: Optional[str] = None,
+) -> int:
     """
-    Для каждого parser-функции:
-      1. Вызывает её (await если async, иначе синхронно).
-      2. Получает list[dict] с ключами:
-         external_id, name, date, tickets_sold, tickets_total, source, url
-      3. Ищет в БД концерт с таким external_id+source.
-      4. Если найден — обновляет его поля, иначе создаёт новый Concert.
-    После обработки всех парсеров делает один commit().
+    Переносит концерты с date < before из concerts в concerts_archive
+    пачками по batch_size, каждая пачка — отдельная транзакция.
+    external_id_like — переносить только концерты с external_id LIKE шаблону.
+    Возвращает число перенесённых строк.
     """
-    for parser in parsers:
-        events = await parser() if inspect.iscoroutinefunction(parser) else parser()
+    columns = [c.name for c in Concert.__table__.columns]
+    stmt = select(Concert.id).where(Concert.date < before)
+    if external_id_like is not None:
+        stmt = stmt.where(Concert.external_id.like(external_id_like))
+    moved = 0
+    while True:
+        ids = (await session.execute(
+            stmt.order_by(Concert.id).limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            return moved
 
-        for ev in events:
+        await session.execute(
+            insert(ConcertArchive).from_select(
+                columns,
+                select(*(Concert.__table__.c[c] for c in columns)).where(Concert.id.in_(ids)),
+            )
+        )
+        await session.execute(
+            delete(Concert).where(Concert.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        moved += len(ids)
+
+
+async def list_cities(session: AsyncSession) -> list[str]:
+    """Города, в которых есть будущие концерты."""
+    stmt = (
+        select(Concert.city)
+        .where(Concert.date >= datetime.utcnow(), Concert.city.isnot(None))
+        .distinct()
+        .order_by(Concert.city)
+    )
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+# Сколько external_id искать одним SELECT ... IN (...) при upsert
+UPSERT_LOOKUP_BATCH = 500
+
+
+async def _load_existing(
+        session: AsyncSession,
+        events: list[dict],
+) -> dict[tuple[SourceEnum, str], Concert]:
+    """Уже сохранённые концерты для events: пачками IN по каждому источнику."""
+    ids_by_source: dict[SourceEnum, list[str]] = {}
+    for ev in events:
+        ids_by_source.setdefault(ev["source"], []).append(ev["external_id"])
+
+    existing: dict[tuple[SourceEnum, str], Concert] = {}
+    for source, ids in ids_by_source.items():
+        for i in range(0, len(ids), UPSERT_LOOKUP_BATCH):
             stmt = select(Concert).where(
-                Concert.external_id == ev["external_id"],
-                Concert.source == ev["source"]
+                Concert.source == source,
+                Concert.external_id.in_(ids[i:i + UPSERT_LOOKUP_BATCH]),
             )
             res = await session.execute(stmt)
-            existing = res.scalars().first()
-
-            if existing:
-                existing.name = ev["name"]
-                existing.date = ev["date"]
-                existing.tickets_sold = ev["tickets_sold"]
-                existing.tickets_total = ev["tickets_total"]
-                existing.url = ev["url"]
-            else:
-                session.add(Concert(
-                    external_id=ev["external_id"],
-                    name=ev["name"],
-                    date=ev["date"],
-                    tickets_sold=ev["tickets_sold"],
-                    tickets_total=ev["tickets_total"],
-                    source=ev["source"],
-                    url=ev["url"],
-                ))
+            for concert in res.scalars():
+                existing[(concert.source, concert.external_id)] = concert
+    return existing
+
+
+async def upsert_events(session: AsyncSession, events: list[dict]) -> int:
+    """
+    Upsert уже полученных событий (без commit()).
+    Прошедшие события отбрасываются (drop_past_events); для остальных ищем
+    концерт с таким external_id+source и обновляем его, иначе создаём новый.
+    В sales_history дописывается наблюдение (сейчас, tickets_sold).
+    Работает одинаково на Postgres и SQLite: существующие строки читаются
+    пачками (SELECT ... IN), а не отдельным запросом на каждое событие.
+    Возвращает число обработанных событий.
+    """
+    events = drop_past_events(events)
+    now = datetime.utcnow()
+    existing = await _load_existing(session, events)
+
+    for ev in events:
+        concert = existing.get((ev["source"], ev["external_id"]))
+
+        if concert:
+            concert.name = ev["name"]
+            concert.date = ev["date"]
+            concert.tickets_sold = ev["tickets_sold"]
+            concert.tickets_total = ev["tickets_total"]
+            concert.url = ev["url"]
+            concert.city = ev.get("city")
+            concert.org_id = ev.get("org_id")
+            concert.sales_history = append_observation(
+                concert.sales_history, now, ev["tickets_sold"]
+            )
+        else:
+            concert = Concert(
+                external_id=ev["external_id"],
+                name=ev["name"],
+                date=ev["date"],
+                tickets_sold=ev["tickets_sold"],
+                tickets_total=ev["tickets_total"],
+                source=ev["source"],
+                url=ev["url"],
+                city=ev.get("city"),
+                org_id=ev.get("org_id"),
+                sales_history=append_observation(None, now, ev["tickets_sold"]),
+            )
+            session.add(concert)
+            # повтор того же события в пачке обновит только что созданный концерт
+            existing[(ev["source"], ev["external_id"])] = concert
+
+    return len(events)
+
+
+async def observe_unchanged_sales(
+        session: AsyncSession,
+        source: SourceEnum,
+        seen: Iterable[str] = (),
+) -> int:
+    """
+    Дописывает наблюдение (сейчас, tickets_sold) в sales_history будущих
+    концертов source, которых не было в upsert этого цикла (ответ источника
+    или его части не изменился — продажи стоят). Без commit().
+    Так прогноз видит остановку продаж, а не продлевает прошлый рост.
+    Возвращает число концертов с новым наблюдением.
+    """
+    seen = set(seen)
+    now = datetime.utcnow()
+    stmt = select(Concert).where(Concert.source == source, Concert.date >= upcoming_cutoff())
+    count = 0
+    for concert in (await session.execute(stmt)).scalars():
+        if concert.external_id in seen:
+            continue
+        concert.sales_history = append_observation(
+            concert.sales_history, now, concert.tickets_sold
+        )
+        count += 1
+    return count
+
+
+async def get_sync_states(session: AsyncSession) -> dict[SourceEnum, SyncState]:
+    """Контрольные точки загрузки по всем источникам."""
+    result = await session.execute(select(SyncState))
+    return {st.source: st for st in result.scalars().all()}
+
+
+async def mark_sync(
+        session: AsyncSession,
+        source: SourceEnum,
+        error: Optional[str] = None,
+) -> None:
+    """
+    Записывает результат попытки синхронизации источника и делает commit().
+    error is None — успех: обновляется last_success_at, счётчик ошибок сбрасывается.
+    """
+    now = datetime.utcnow()
+    state = await session.get(SyncState, source)
+    if state is None:
+        state = SyncState(source=source, consecutive_failures=0)
+        session.add(state)
+
+    state.last_attempt_at = now
+    if error is None:
+        state.last_success_at = now
+        state.last_error = None
+        state.consecutive_failures = 0
+    else:
+        state.last_error = error[:1000]
+        state.consecutive_failures = (state.consecutive_failures or 0) + 1
 
     await session.commit()
@@ -0,0 +1,24 @@
+# standup_ticket_bot/cutoff.py
+"""Граница «прошедших» событий — общая для парсеров и upsert."""
+
+import os
+from datetime import datetime, timedelta
+from typing import List
+
+# Сколько часов после начала событие ещё считается актуальным
+INGEST_PAST_GRACE_HOURS = float(os.getenv("INGEST_PAST_GRACE_HOURS", "0"))
+
+
+def upcoming_cutoff() -> datetime:
+    """Naive-UTC граница: события раньше неё в загрузку не попадают."""
+    return datetime.utcnow() - timedelta(hours=INGEST_PAST_GRACE_HOURS)
+
+
+def drop_past_events(items: List[dict]) -> List[dict]:
+    """Общий этап для всех источников: выкидывает прошедшие события.
+
+    Источники, которые умеют фильтровать по дате на стороне API, сюда уже
+    присылают только будущие события; для остальных это client-side fallback.
+    """
+    cutoff = upcoming_cutoff()
+    return [it for it in items if it["date"] >= cutoff]
@@ -4,21 +4,82 @@ from dotenv import load_dotenv, find_dotenv
 # Загружаем .env из корня проекта
 load_dotenv(find_dotenv())
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from typing import Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+# Postgres (postgresql+asyncpg://...) или встроенный SQLite (sqlite+aiosqlite:///путь.db).
+# Значения по умолчанию нет: без DATABASE_URL init_db() падает, а не заводит
+# молча пустую базу внутри контейнера.
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL не задан в .env")
+DB_ECHO = os.getenv("DB_ECHO", "1").lower() in ("1", "true", "yes")
+
+# PRAGMA для SQLite: WAL (читатели не ждут писателя), ослабленный fsync,
+# ожидание блокировки вместо «database is locked», кэш и temp-таблицы в памяти
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",       # ~20 МБ
+    "PRAGMA mmap_size=134217728",     # 128 МБ
+)
+
+
+def make_engine(url: str, echo: bool = DB_ECHO) -> AsyncEngine:
+    """Асинхронный движок для Postgres или SQLite (с PRAGMA из SQLITE_PRAGMAS)."""
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, echo=echo)
 
-# Создаём асинхронный движок и сессию
-engine = create_async_engine(DATABASE_URL, echo=True)
+    kwargs = {}
+    if ":memory:" in url or url.rstrip("/").endswith("sqlite+aiosqlite:"):
+        # in-memory БД живёт, пока жив коннект — держим ровно один на процесс.
+        # Пул из одного соединения (не StaticPool): параллельные сессии ждут
+        # своей очереди, а не пишут в одну транзакцию — commit/rollback
+        # одного источника не задевает другой.
+        kwargs = {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": 1,
+            "max_overflow": 0,
+            "connect_args": {"check_same_thread": False},
+        }
+    sqlite_engine = create_async_engine(url, echo=echo, **kwargs)
+
+    @event.listens_for(sqlite_engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_conn, _record) -> None:
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return sqlite_engine
+
+
+# Создаём асинхронный движок и сессию (без DATABASE_URL — только после configure())
+engine: Optional[AsyncEngine] = make_engine(DATABASE_URL) if DATABASE_URL else None
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
+
+def configure(url: str, echo: bool = DB_ECHO) -> AsyncEngine:
+    """
+    Переключает движок на другую БД (CLI bench, тесты): AsyncSessionLocal
+    импортирован по всему проекту, поэтому перенастраиваем его, а не заменяем.
+    """
+    global engine, DATABASE_URL
+    engine = make_engine(url, echo=echo)
+    DATABASE_URL = url
+    AsyncSessionLocal.configure(bind=engine)
+    return engine
+
+
 Base = declarative_base()
 
 
@@ -27,5 +88,31 @@ async def init_db():
     Создаёт все таблицы в БД (если их ещё нет).
     Вызывать перед любыми операциями с базой.
     """
+    if engine is None:
+        raise RuntimeError(
+            "DATABASE_URL не задан в .env (Postgres: postgresql+asyncpg://..., "
+            "встроенный SQLite: sqlite+aiosqlite:///./standup.db)"
+        )
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+
+
+def _add_missing_columns(sync_conn) -> None:
+    """
+    create_all не трогает уже существующие таблицы, поэтому новые
+    nullable-колонки (и их индексы) добавляем сами через ALTER TABLE.
+    """
+    insp = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        columns = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in columns or not col.nullable:
+                continue
+            col_type = col.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+
+        indexes = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(sync_conn)
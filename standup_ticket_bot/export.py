@@ -0,0 +1,132 @@
+# standup_ticket_bot/export.py
+"""CSV-выгрузка концертов для /export.
+
+Строки идут из stream_concerts() (server-side cursor) через генератор CSV
+прямо во временный файл — в памяти одновременно живёт только одна пачка
+строк, сколько бы концертов ни было в истории.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from standup_ticket_bot.concert_repository import stream_concerts
+from standup_ticket_bot.models.concert import SourceEnum
+
+CSV_HEADER = (
+    "date", "name", "source", "city", "org_id",
+    "tickets_sold", "tickets_total", "sold_pct", "external_id", "url",
+)
+
+WHEN_ALIASES = {
+    "future": "future", "будущие": "future",
+    "past": "past", "прошедшие": "past",
+    "all": "all", "все": "all",
+}
+
+
+@dataclass
+class ExportFilter:
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None      # не включительно
+    source: Optional[SourceEnum] = None
+    when: str = "future"
+
+    def describe(self) -> str:
+        parts = [{"future": "будущие", "past": "прошедшие", "all": "все"}[self.when]]
+        if self.source:
+            parts.append(self.source.value)
+        if self.date_from:
+            parts.append(f"с {self.date_from:%Y-%m-%d}")
+        if self.date_to:
+            parts.append(f"по {(self.date_to - timedelta(days=1)):%Y-%m-%d}")
+        return ", ".join(parts)
+
+
+def parse_export_args(args: Optional[str]) -> ExportFilter:
+    """
+    /export [YYYY-MM-DD [YYYY-MM-DD]] [yandex|gostandup|timepad] [future|past|all]
+    Аргументы в любом порядке; первая дата — начало, вторая — конец (включительно).
+    Неизвестный аргумент → ValueError с пояснением.
+    """
+    flt = ExportFilter()
+    dates: list[datetime] = []
+    when: Optional[str] = None
+    for token in (args or "").split():
+        low = token.lower()
+        if low in WHEN_ALIASES:
+            when = WHEN_ALIASES[low]
+        elif low.upper() in SourceEnum.__members__:
+            flt.source = SourceEnum[low.upper()]
+        else:
+            try:
+                dates.append(datetime.strptime(token, "%Y-%m-%d"))
+            except ValueError:
+                raise ValueError(f"Не понял аргумент «{token}»") from None
+
+    if len(dates) > 2:
+        raise ValueError("Нужно не больше двух дат: начало и конец")
+    # Без past/future: с датами — все концерты диапазона, без дат — будущие
+    flt.when = when or ("all" if dates else "future")
+    if dates:
+        flt.date_from = dates[0]
+    if len(dates) == 2:
+        flt.date_to = dates[1] + timedelta(days=1)
+    return flt
+
+
+async def iter_csv(rows: AsyncIterator[tuple]) -> AsyncIterator[str]:
+    """Генератор CSV: заголовок, затем по строке на концерт."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def _flush() -> str:
+        line = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return line
+
+    writer.writerow(CSV_HEADER)
+    yield _flush()
+
+    async for date, name, source, city, org_id, sold, total, external_id, url in rows:
+        pct = f"{sold / total * 100:.1f}" if total else ""
+        writer.writerow((
+            date.strftime("%Y-%m-%d %H:%M"), name, source.value, city or "", org_id or "",
+            sold, total, pct, external_id, url or "",
+        ))
+        yield _flush()
+
+
+async def export_to_file(session: AsyncSession, flt: ExportFilter) -> tuple[str, int]:
+    """
+    Пишет выгрузку во временный CSV-файл и возвращает (путь, число строк).
+    Файл удаляет вызывающий код.
+    """
+    rows = stream_concerts(
+        session,
+        date_from=flt.date_from,
+        date_to=flt.date_to,
+        source=flt.source,
+        when=flt.when,
+    )
+    count = -1  # заголовок не считаем
+    # utf-8-sig — чтобы Excel сразу открыл кириллицу
+    fd, path = tempfile.mkstemp(prefix="concerts_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8-sig", newline="") as fh:
+            async for line in iter_csv(rows):
+                fh.write(line)
+                count += 1
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, count
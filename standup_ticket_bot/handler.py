@@ -1,10 +1,17 @@
+import html
+import os
 from datetime import datetime, timedelta
 from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    Message, FSInputFile, InlineQuery, InlineQueryResultArticle, InputTextMessageContent,
+)
 
+from standup_ticket_bot import concert_index
 from standup_ticket_bot.database import AsyncSessionLocal
-from standup_ticket_bot.concert_repository import list_concerts
+from standup_ticket_bot.concert_repository import list_concerts, list_cities, get_sync_states
+from standup_ticket_bot.export import parse_export_args, export_to_file
+from standup_ticket_bot.ingest import REFRESH_INTERVAL_MIN
 from standup_ticket_bot.keyboards import main_kb
 from standup_ticket_bot.models.concert import SourceEnum
 
@@ -20,51 +27,130 @@ SOURCE_ICONS: dict[SourceEnum, str] = {
 # оставляем запас для тегов и разделителей
 MAX_MESSAGE_SIZE = 3800
 
+# Inline-режим: сколько результатов отдавать и сколько секунд Telegram
+# может кэшировать ответ на одинаковый запрос
+INLINE_RESULTS_LIMIT = 50
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "60"))
 
-async def _send_concerts(message: Message, concerts: list, title: str) -> None:
+# Выбранный город для каждого чата (/city); нет записи — все города
+_chat_city: dict[int, str] = {}
+
+
+def _ago(delta: timedelta) -> str:
+    minutes = int(delta.total_seconds() // 60)
+    if minutes < 1:
+        return "только что"
+    if minutes < 60:
+        return f"{minutes} мин назад"
+    if minutes < 48 * 60:
+        return f"{minutes // 60} ч назад"
+    return f"{minutes // (24 * 60)} дн назад"
+
+
+def _freshness_line(states: dict) -> str:
+    """
+    «Обновлено: Яндекс 5 мин назад · Timepad 3 ч назад ⚠️» —
+    по последней успешной синхронизации каждого источника.
+    ⚠️ — данные старше двух периодов обновления.
+    """
+    now = datetime.utcnow()
+    stale_after = timedelta(minutes=2 * REFRESH_INTERVAL_MIN)
+    parts = []
+    for source, name in SOURCE_ICONS.items():
+        st = states.get(source)
+        if st is None or st.last_success_at is None:
+            parts.append(f"{name} нет данных ⚠️")
+            continue
+        age = now - st.last_success_at
+        parts.append(f"{name} {_ago(age)}" + (" ⚠️" if age > stale_after else ""))
+    return "Обновлено: " + " · ".join(parts)
+
+
+async def _show_concerts(message: Message, days_ahead: int | None, title: str) -> None:
+    """Концерты с учётом города, выбранного в чате, + метка свежести данных."""
+    city = _chat_city.get(message.chat.id)
+    async with AsyncSessionLocal() as session:
+        concerts = await list_concerts(session, days_ahead=days_ahead, city=city)
+        states = await get_sync_states(session)
+    if city:
+        title = f"{title} — {city}"
+    await _send_concerts(message, concerts, title, _freshness_line(states))
+
+
+def _local_dt_str(ev) -> str:
+    # Локализуем время: только для Timepad добавляем +3 часа
+    if ev.source == SourceEnum.TIMEPAD:
+        dt_local = ev.date + timedelta(hours=3)
+    else:
+        dt_local = ev.date
+    return dt_local.strftime("%Y-%m-%d %H:%M")
+
+
+# Пороги маркера по прогнозу итоговой заполняемости (forecast.py)
+PROJECTED_RED = 0.5
+PROJECTED_ORANGE = 0.7
+PROJECTED_YELLOW = 0.9
+
+
+def _marker(ev, now: datetime, projected: int | None = None) -> str:
+    """
+    Цветовой маркер. Если есть прогноз итоговых продаж — по прогнозируемой
+    заполняемости; иначе — по оставшимся дням и текущему проценту продаж.
+    """
+    if projected is not None and ev.tickets_total:
+        pct = projected / ev.tickets_total
+        if pct < PROJECTED_RED:
+            return "🔴 "
+        elif pct < PROJECTED_ORANGE:
+            return "🟠 "
+        elif pct < PROJECTED_YELLOW:
+            return "🟡 "
+        return "🟢 "
+
+    days_left = (ev.date - now).total_seconds() / 86400
+    sold_pct = ev.tickets_sold / ev.tickets_total if ev.tickets_total else 0
+
+    if days_left < 3:
+        return "🔴 " if sold_pct < 0.7 else "🟢 "
+    elif days_left < 7:
+        return "🟠 " if sold_pct < 0.5 else "🟢 "
+    elif days_left < 14:
+        return "🟡 " if sold_pct < 0.3 else "🟢 "
+    return "🟢 "
+
+
+def _concert_block(ev, now: datetime) -> str:
+    """Блок концерта (без ссылки) — для списков и inline-ответов."""
+    projected = concert_index.projected_sold(ev.id)
+
+    icon = SOURCE_ICONS.get(ev.source, ev.source.name)
+    if ev.city:
+        icon = f"{icon} · {html.escape(ev.city)}"
+    block = (
+        f"{_marker(ev, now, projected)}{icon}\n"
+        f"<b>{html.escape(ev.name)}</b>\n"
+        f"{_local_dt_str(ev)}\n"
+        f"{ev.tickets_sold}/{ev.tickets_total}\n"
+    )
+    if projected is not None and projected > ev.tickets_sold:
+        block += f"прогноз {projected}/{ev.tickets_total}\n"
+    return block
+
+
+async def _send_concerts(message: Message, concerts: list, title: str, subtitle: str = "") -> None:
     if not concerts:
         await message.answer(
-            "Концертов не найдено.",
+            "Концертов не найдено." + (f"\n{subtitle}" if subtitle else ""),
             reply_markup=main_kb
         )
         return
 
-    header = f"<b>{title}</b>\n\n"
+    header = f"<b>{title}</b>\n" + (f"<i>{subtitle}</i>\n" if subtitle else "") + "\n"
     chunk = header
 
+    now = datetime.utcnow()
     for ev in concerts:
-        icon = SOURCE_ICONS.get(ev.source, ev.source.name)
-
-        # Локализуем время: только для Timepad добавляем +3 часа
-        if ev.source == SourceEnum.TIMEPAD:
-            dt_local = ev.date + timedelta(hours=3)
-        else:
-            dt_local = ev.date
-        dt_str = dt_local.strftime("%Y-%m-%d %H:%M")
-
-        # Вычисляем оставшиеся дни и процент продаж
-        now = datetime.utcnow()
-        delta = ev.date - now
-        days_left = delta.total_seconds() / 86400
-        sold_pct = ev.tickets_sold / ev.tickets_total if ev.tickets_total else 0
-
-        # Определяем маркер цвета в зависимости от условий
-        if days_left < 3:
-            marker = "🔴 " if sold_pct < 0.7 else "🟢 "
-        elif days_left < 7:
-            marker = "🟠 " if sold_pct < 0.5 else "🟢 "
-        elif days_left < 14:
-            marker = "🟡 " if sold_pct < 0.3 else "🟢 "
-        else:
-            marker = "🟢 "
-
-        # Формируем блок без ссылки
-        block = (
-            f"{marker}{icon}\n"
-            f"<b>{ev.name}</b>\n"
-            f"{dt_str}\n"
-            f"{ev.tickets_sold}/{ev.tickets_total}\n\n"
-        )
+        block = _concert_block(ev, now) + "\n"
 
         # Если блок превышает размер сообщения, отправляем текущий и начинаем новый
         if len(chunk) + len(block) > MAX_MESSAGE_SIZE:
@@ -97,29 +183,110 @@ async def start_handler(message: Message):
     )
 
 
+@router.message(Command("city"))
+async def city_handler(message: Message, command: CommandObject):
+    """
+    /city          — показать выбранный город и доступные города
+    /city <город>  — показывать концерты только этого города
+    /city все      — снова показывать все города
+    """
+    arg = (command.args or "").strip()
+    chat_id = message.chat.id
+
+    if not arg:
+        async with AsyncSessionLocal() as session:
+            cities = await list_cities(session)
+        current = _chat_city.get(chat_id, "все города")
+        await message.answer(
+            f"Сейчас: {current}\n"
+            f"Доступные города: {', '.join(cities) or '—'}\n"
+            "Выбрать: /city <город>, сбросить: /city все",
+            reply_markup=main_kb,
+        )
+        return
+
+    if arg.lower() in ("все", "all", "*"):
+        _chat_city.pop(chat_id, None)
+        await message.answer("Показываю концерты всех городов.", reply_markup=main_kb)
+    else:
+        async with AsyncSessionLocal() as session:
+            cities = await list_cities(session)
+        # Сравниваем без учёта регистра, а храним написание из БД: list_concerts
+        # ищет точное совпадение (lower() в SQLite не понимает кириллицу)
+        city = next((c for c in cities if c.casefold() == arg.casefold()), None)
+        if city is None:
+            await message.answer(
+                f"Нет предстоящих концертов в городе «{arg}».\n"
+                f"Доступные города: {', '.join(cities) or '—'}",
+                reply_markup=main_kb,
+            )
+            return
+        _chat_city[chat_id] = city
+        await message.answer(f"Показываю концерты города: {city}", reply_markup=main_kb)
+
+
+@router.message(Command("export"))
+async def export_handler(message: Message, command: CommandObject):
+    """
+    /export [YYYY-MM-DD [YYYY-MM-DD]] [yandex|gostandup|timepad] [future|past|all]
+    Присылает CSV с концертами и продажами документом.
+    """
+    try:
+        flt = parse_export_args(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"{e}.\nФормат: /export [С ПО] [yandex|gostandup|timepad] [future|past|all]\n"
+            "Даты — YYYY-MM-DD, например: /export 2024-01-01 2024-12-31 past",
+            reply_markup=main_kb,
+        )
+        return
+
+    async with AsyncSessionLocal() as session:
+        path, count = await export_to_file(session, flt)
+    try:
+        stamp = datetime.utcnow().strftime("%Y%m%d_%H%M")
+        await message.answer_document(
+            FSInputFile(path, filename=f"concerts_{stamp}.csv"),
+            caption=f"Концерты ({flt.describe()}): {count}",
+            reply_markup=main_kb,
+        )
+    finally:
+        os.unlink(path)
+
+
 @router.message(F.text == "Все концерты")
 async def all_concerts_handler(message: Message):
-    async with AsyncSessionLocal() as session:
-        concerts = await list_concerts(session, days_ahead=None)
-    await _send_concerts(message, concerts, "Все концерты")
+    await _show_concerts(message, days_ahead=None, title="Все концерты")
 
 
 @router.message(F.text == "Ближайшие 3 дня")
 async def concerts_3_days_handler(message: Message):
-    async with AsyncSessionLocal() as session:
-        concerts = await list_concerts(session, days_ahead=3)
-    await _send_concerts(message, concerts, "Концерты на ближайшие 3 дня")
+    await _show_concerts(message, days_ahead=3, title="Концерты на ближайшие 3 дня")
 
 
 @router.message(F.text == "Ближайшие 7 дней")
 async def concerts_7_days_handler(message: Message):
-    async with AsyncSessionLocal() as session:
-        concerts = await list_concerts(session, days_ahead=7)
-    await _send_concerts(message, concerts, "Концерты на ближайшие 7 дней")
+    await _show_concerts(message, days_ahead=7, title="Концерты на ближайшие 7 дней")
 
 
 @router.message(F.text == "Ближайшие 21 день")
 async def concerts_21_days_handler(message: Message):
-    async with AsyncSessionLocal() as session:
-        concerts = await list_concerts(session, days_ahead=21)
-    await _send_concerts(message, concerts, "Концерты на ближайшие 21 день")
+    await _show_concerts(message, days_ahead=21, title="Концерты на ближайшие 21 день")
+
+
+@router.inline_query()
+async def inline_concerts_handler(query: InlineQuery):
+    """@bot <текст> — будущие концерты из in-memory индекса (без запроса в БД)."""
+    now = datetime.utcnow()
+    results = []
+    for ev in concert_index.search(query.query, limit=INLINE_RESULTS_LIMIT):
+        results.append(InlineQueryResultArticle(
+            id=str(ev.id),
+            title=f"{_marker(ev, now, ev.projected)}{ev.name}",
+            description=f"{_local_dt_str(ev)} · {ev.tickets_sold}/{ev.tickets_total}",
+            input_message_content=InputTextMessageContent(
+                message_text=_concert_block(ev, now),
+                parse_mode="HTML",
+            ),
+        ))
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
@@ -1,10 +1,8 @@
-from datetime import datetime, timedelta
-
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
-from sqlalchemy import select
 
+from standup_ticket_bot.concert_repository import list_concerts
 from standup_ticket_bot.database import AsyncSessionLocal
 from standup_ticket_bot.models.concert import Concert
 from standup_ticket_bot.handlers.utils import format_concert_row
@@ -14,12 +12,7 @@ router = Router()
 
 async def _fetch_concerts(days: int | None = None) -> list[Concert]:
     async with AsyncSessionLocal() as session:
-        stmt = select(Concert)
-        if days is not None:
-            now = datetime.utcnow()
-            stmt = stmt.where(Concert.date.between(now, now + timedelta(days=days)))
-        result = await session.execute(stmt)
-        return result.scalars().all()
+        return await list_concerts(session, days_ahead=days)
 
 
 async def _send_concerts(message: Message, concerts: list[Concert]) -> None:
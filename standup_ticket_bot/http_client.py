@@ -0,0 +1,311 @@
+# standup_ticket_bot/http_client.py
+"""HTTP-клиент для внешних источников (Yandex CRM, GoStandUp, Timepad).
+
+У каждого источника свой ClientSession со своим пулом соединений:
+    • лимиты соединений (всего и на хост), keep-alive, DNS-кэш;
+    • раздельные таймауты на подключение и чтение;
+    • ограничение размера ответа (HTTP_MAX_BODY_BYTES);
+    • gzip/deflate (aiohttp сам запрашивает и распаковывает);
+    • опциональная трассировка: DNS, connect и TTFB каждого запроса;
+    • условные запросы (ETag / If-Modified-Since) и хэш тела ответа:
+      Response.unchanged говорит, что upstream с прошлого раза не менялся.
+
+Сессии создаются лениво и закрываются через close_sessions()
+при остановке бота / CLI.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Any, Deque, Dict, Mapping, Optional
+
+import aiohttp
+from multidict import CIMultiDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------------------------------------------------------------------------
+# Настройки (через .env)
+# ---------------------------------------------------------------------------
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "20"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "8"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))              # сек
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))         # сек
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "90"))
+HTTP_MAX_BODY_BYTES = int(os.getenv("HTTP_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+HTTP_TRACE = os.getenv("HTTP_TRACE", "0").lower() in ("1", "true", "yes")
+# Не доверяем «не изменилось» больше N циклов подряд — после этого ответ
+# обрабатывается полностью, даже если он тот же. Считаем в циклах, а не в
+# секундах, чтобы не зависеть от REFRESH_INTERVAL_MIN.
+HTTP_REVALIDATE_CYCLES = int(os.getenv("HTTP_REVALIDATE_CYCLES", "6"))
+
+# Переопределение лимита на хост для отдельного источника:
+#   HTTP_POOL_LIMIT_PER_HOST_TIMEPAD=4
+_PER_SOURCE_LIMIT_ENV = "HTTP_POOL_LIMIT_PER_HOST_{}"
+
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+
+# ---------------------------------------------------------------------------
+# Трассировка
+# ---------------------------------------------------------------------------
+@dataclass
+class RequestTiming:
+    """Тайминги одного запроса, в миллисекундах (None — этапа не было)."""
+    source: str
+    method: str
+    url: str
+    status: Optional[int] = None
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    marks: Dict[str, float] = field(default_factory=dict, repr=False)
+
+    def finish(self) -> None:
+        m = self.marks
+        self.dns_ms = _ms(m.get("dns_start"), m.get("dns_end"))
+        self.connect_ms = _ms(m.get("conn_start"), m.get("conn_end"))
+        self.ttfb_ms = _ms(m.get("request"), m.get("response"))
+        self.total_ms = _ms(m.get("request"), time.perf_counter())
+
+
+# Последние N запросов — для отчёта `refresh --profile` (cli.py)
+_timings: Deque[RequestTiming] = deque(maxlen=500)
+
+
+def recent_timings() -> list[RequestTiming]:
+    """Последние записанные тайминги (если HTTP_TRACE включён)."""
+    return list(_timings)
+
+
+def _ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 1)
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """TraceConfig, заполняющий RequestTiming из trace_request_ctx запроса."""
+    tc = aiohttp.TraceConfig()
+
+    def _mark(name: str):
+        async def _handler(session, ctx, params) -> None:
+            if ctx.trace_request_ctx is not None:
+                ctx.trace_request_ctx.marks[name] = time.perf_counter()
+        return _handler
+
+    tc.on_request_start.append(_mark("request"))
+    tc.on_dns_resolvehost_start.append(_mark("dns_start"))
+    tc.on_dns_resolvehost_end.append(_mark("dns_end"))
+    tc.on_connection_create_start.append(_mark("conn_start"))
+    tc.on_connection_create_end.append(_mark("conn_end"))
+    # on_request_end приходит, когда получены заголовки ответа → TTFB
+    tc.on_request_end.append(_mark("response"))
+    return tc
+
+
+# ---------------------------------------------------------------------------
+# Сессии
+# ---------------------------------------------------------------------------
+def _limit_per_host(source: str) -> int:
+    raw = os.getenv(_PER_SOURCE_LIMIT_ENV.format(source.upper()))
+    return int(raw) if raw else HTTP_POOL_LIMIT_PER_HOST
+
+
+def session(source: str) -> aiohttp.ClientSession:
+    """ClientSession источника (создаётся при первом обращении)."""
+    s = _sessions.get(source)
+    if s is None or s.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=_limit_per_host(source),
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=HTTP_TOTAL_TIMEOUT,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT,
+        )
+        s = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[_trace_config()] if HTTP_TRACE else None,
+        )
+        _sessions[source] = s
+    return s
+
+
+async def close_sessions() -> None:
+    """Закрывает все открытые сессии (вызывать при завершении)."""
+    while _sessions:
+        _, s = _sessions.popitem()
+        if not s.closed:
+            await s.close()
+
+
+# ---------------------------------------------------------------------------
+# Запросы
+# ---------------------------------------------------------------------------
+class ResponseTooLarge(RuntimeError):
+    """Ответ превысил HTTP_MAX_BODY_BYTES."""
+
+
+@dataclass
+class Response:
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    charset: Optional[str] = field(default=None)
+    digest: Optional[str] = None       # sha256 тела (если задан cache_key)
+    unchanged: bool = False            # 304 или тот же хэш, что в прошлый раз
+
+    def text(self) -> str:
+        return self.body.decode(self.charset or "utf-8", errors="replace")
+
+
+# ---------------------------------------------------------------------------
+# Валидаторы ответов (ETag / Last-Modified / хэш тела)
+# ---------------------------------------------------------------------------
+@dataclass
+class _Validator:
+    digest: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    body: Optional[bytes] = None       # нужно, чтобы отдать тело при 304
+    charset: Optional[str] = None
+    hits: int = 0                      # сколько циклов подряд ответ не менялся
+
+
+# Подтверждённые валидаторы: данные по ним уже записаны в БД
+_validators: Dict[str, _Validator] = {}
+# Валидаторы текущего цикла по источникам — ждут confirm()/discard()
+_pending: Dict[str, Dict[str, _Validator]] = {}
+# Ключи, запрошенные источником в последнем подтверждённом цикле
+_confirmed_keys: Dict[str, frozenset[str]] = {}
+
+
+def confirm(source: str) -> None:
+    """
+    Ответы источника обработаны и сохранены — запоминаем их валидаторы.
+    Валидаторы ключей, которые источник в этом цикле не запрашивал
+    (прошедшие события и т.п.), удаляются — _validators не растёт бесконечно.
+    """
+    pending = _pending.pop(source, {})
+    for key in _confirmed_keys.get(source, frozenset()) - pending.keys():
+        _validators.pop(key, None)
+    _confirmed_keys[source] = frozenset(pending)
+    _validators.update(pending)
+
+
+def discard(source: str) -> None:
+    """Цикл источника не удался — в следующий раз обработать ответы заново."""
+    _pending.pop(source, None)
+
+
+def _known(cache_key: str) -> Optional[_Validator]:
+    v = _validators.get(cache_key)
+    if v is None or v.hits >= HTTP_REVALIDATE_CYCLES:
+        return None
+    return v
+
+
+async def _read_capped(resp: aiohttp.ClientResponse, limit: int) -> bytes:
+    """Читает тело ответа по кускам, не давая ему вырасти больше limit."""
+    declared = resp.content_length
+    if declared is not None and declared > limit:
+        raise ResponseTooLarge(f"{resp.url.host}: Content-Length {declared} > {limit}")
+
+    buf = bytearray()
+    async for chunk in resp.content.iter_chunked(64 * 1024):
+        buf += chunk
+        if len(buf) > limit:
+            raise ResponseTooLarge(f"{resp.url.host}: ответ больше {limit} байт")
+    return bytes(buf)
+
+
+async def get(
+        source: str,
+        url: str,
+        *,
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        raise_for_status: bool = True,
+        max_body: int = HTTP_MAX_BODY_BYTES,
+        cache_key: Optional[str] = None,
+) -> Response:
+    """GET через пул источника source; тело ограничено max_body байтами.
+
+    С cache_key запрос становится условным (If-None-Match / If-Modified-Since,
+    если сервер раньше прислал ETag / Last-Modified), а тело хэшируется:
+    Response.unchanged=True, если upstream ответил 304 или прислал то же самое.
+    Ключ должен описывать запрос без меняющихся частей (подписи, timestamp).
+    """
+    known = _known(cache_key) if cache_key else None
+    if known is not None:
+        headers = dict(headers or {})
+        if known.etag:
+            headers["If-None-Match"] = known.etag
+        if known.last_modified:
+            headers["If-Modified-Since"] = known.last_modified
+
+    timing = RequestTiming(source=source, method="GET", url=url) if HTTP_TRACE else None
+    async with session(source).get(
+            url, params=params, headers=headers, trace_request_ctx=timing,
+    ) as resp:
+        if raise_for_status:
+            resp.raise_for_status()
+        if resp.status == 304 and known is not None and known.body is not None:
+            result = Response(
+                status=resp.status,
+                headers=CIMultiDict(resp.headers),
+                body=known.body,
+                charset=known.charset,
+                digest=known.digest,
+                unchanged=True,
+            )
+        else:
+            body = await _read_capped(resp, max_body)
+            result = Response(
+                status=resp.status,
+                headers=CIMultiDict(resp.headers),
+                body=body,
+                charset=resp.charset,
+            )
+
+    if cache_key and result.digest is None:
+        result.digest = hashlib.sha256(result.body).hexdigest()
+        result.unchanged = known is not None and known.digest == result.digest
+        etag = result.headers.get("ETag")
+        last_modified = result.headers.get("Last-Modified")
+        _pending.setdefault(source, {})[cache_key] = _Validator(
+            digest=result.digest,
+            etag=etag,
+            last_modified=last_modified,
+            # тело храним, только если сервер умеет 304 — иначе хватает хэша
+            body=result.body if (etag or last_modified) else None,
+            charset=result.charset,
+            hits=known.hits + 1 if result.unchanged else 0,
+        )
+    elif cache_key and known is not None:
+        # 304: валидатор прежний, ещё один цикл без изменений
+        _pending.setdefault(source, {})[cache_key] = replace(known, hits=known.hits + 1)
+
+    if timing is not None:
+        timing.status = result.status
+        timing.finish()
+        _timings.append(timing)
+        print(
+            f"[http] {source} GET {url} → {timing.status}: "
+            f"dns={timing.dns_ms}ms connect={timing.connect_ms}ms "
+            f"ttfb={timing.ttfb_ms}ms total={timing.total_ms}ms"
+        )
+    return result
@@ -0,0 +1,163 @@
+# standup_ticket_bot/ingest.py
+"""Цикл загрузки концертов: каждый источник — в своей транзакции.
+
+Для каждого источника:
+    • своя сессия и свой commit — сбой одного источника не откатывает
+      данные, уже загруженные из других;
+    • повторные попытки с экспоненциальной задержкой (INGEST_RETRIES);
+    • circuit breaker: после INGEST_BREAKER_THRESHOLD неудачных циклов
+      подряд источник пропускается INGEST_BREAKER_COOLDOWN секунд;
+    • результат пишется в sync_state (last_success_at и ошибка) —
+      по нему хендлеры показывают свежесть данных;
+    • если ответ источника не изменился (парсер вернул None), разбор и
+      upsert пропускаются, но синхронизация считается успешной;
+    • концертам, которых не было в ответе (не изменился он или его часть),
+      всё равно дописывается наблюдение продаж — для прогноза (forecast).
+
+После каждого успешного цикла пересобирается in-memory индекс концертов
+для inline-режима (concert_index) — вместе с прогнозом на текущий момент.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from standup_ticket_bot import concert_index, http_client
+from standup_ticket_bot.database import AsyncSessionLocal
+from standup_ticket_bot.concert_repository import upsert_events, observe_unchanged_sales, mark_sync
+from standup_ticket_bot.models.concert import SourceEnum
+from standup_ticket_bot.parsers import PARSERS_BY_SOURCE
+
+# Период фонового обновления (минуты) — используется и для меток свежести
+REFRESH_INTERVAL_MIN = int(os.getenv("REFRESH_INTERVAL_MIN", "120"))
+
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES", "3"))
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "2"))        # сек, удваивается
+INGEST_BREAKER_THRESHOLD = int(os.getenv("INGEST_BREAKER_THRESHOLD", "3"))
+INGEST_BREAKER_COOLDOWN = float(os.getenv("INGEST_BREAKER_COOLDOWN", "1800"))  # сек
+
+
+@dataclass
+class CircuitBreaker:
+    """Размыкается после threshold неудачных циклов подряд на cooldown секунд."""
+    threshold: int = INGEST_BREAKER_THRESHOLD
+    cooldown: float = INGEST_BREAKER_COOLDOWN
+    failures: int = 0
+    opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        # После cooldown пропускаем одну пробную попытку (half-open)
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+_breakers: dict[SourceEnum, CircuitBreaker] = {s: CircuitBreaker() for s in SourceEnum}
+# Не даём /refresh и планировщику обновлять один источник одновременно
+_locks: dict[SourceEnum, asyncio.Lock] = {}
+
+
+@dataclass
+class SourceResult:
+    source: SourceEnum
+    ok: bool
+    skipped: bool = False
+    unchanged: bool = False
+    events: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+async def _ingest_once(source: SourceEnum) -> Optional[int]:
+    """Один проход по источнику; None — ответ не изменился, upsert пропущен."""
+    try:
+        events = await PARSERS_BY_SOURCE[source]()
+        async with AsyncSessionLocal() as session:
+            count = await upsert_events(session, events) if events is not None else None
+            await observe_unchanged_sales(
+                session, source, seen=(ev["external_id"] for ev in events or ())
+            )
+            await mark_sync(session, source)   # commit вместе с upsert
+    except BaseException:
+        http_client.discard(source.value)
+        raise
+    http_client.confirm(source.value)
+    return count
+
+
+async def _record_failure(source: SourceEnum, error: str) -> None:
+    try:
+        async with AsyncSessionLocal() as session:
+            await mark_sync(session, source, error=error)
+    except Exception as e:  # БД недоступна — не маскируем исходную ошибку
+        print(f"‼️  Не удалось записать sync_state для {source.value}:", e)
+
+
+async def refresh_source(source: SourceEnum) -> SourceResult:
+    """Загружает один источник с повторами; исключения наружу не бросает."""
+    lock = _locks.setdefault(source, asyncio.Lock())
+    async with lock:
+        return await _refresh_source(source)
+
+
+async def _refresh_source(source: SourceEnum) -> SourceResult:
+    breaker = _breakers[source]
+    if not breaker.allow():
+        return SourceResult(source, ok=False, skipped=True, error="circuit open")
+
+    started = time.perf_counter()
+    error = None
+    for attempt in range(1, INGEST_RETRIES + 1):
+        try:
+            count = await _ingest_once(source)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempt < INGEST_RETRIES:
+                await asyncio.sleep(INGEST_RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+        breaker.success()
+        return SourceResult(source, ok=True, unchanged=count is None, events=count or 0,
+                            attempts=attempt, seconds=time.perf_counter() - started)
+
+    breaker.failure()
+    await _record_failure(source, error)
+    return SourceResult(source, ok=False, attempts=INGEST_RETRIES, error=error,
+                        seconds=time.perf_counter() - started)
+
+
+async def refresh_sources(sources: Optional[Iterable[SourceEnum]] = None) -> list[SourceResult]:
+    """Параллельно обновляет источники (по умолчанию — все) и печатает итог."""
+    sources = list(sources or PARSERS_BY_SOURCE)
+    results = await asyncio.gather(*(refresh_source(s) for s in sources))
+
+    # И без изменений: прогноз считается на «сейчас» по свежим наблюдениям
+    if any(r.ok for r in results) or concert_index.built_at is None:
+        try:
+            await concert_index.rebuild()
+        except Exception as e:
+            print("‼️  Не удалось пересобрать индекс концертов:", e)
+
+    for r in results:
+        if r.ok and r.unchanged:
+            print(f"=  {r.source.value}: без изменений — разбор и запись пропущены ({r.seconds:.1f} с)")
+        elif r.ok:
+            print(f"✓  {r.source.value}: {r.events} событий за {r.seconds:.1f} с (попыток: {r.attempts})")
+        elif r.skipped:
+            print(f"⏸  {r.source.value}: пропущен — источник временно отключён после ошибок")
+        else:
+            print(f"‼️  {r.source.value}: ошибка после {r.attempts} попыток — {r.error}")
+    return results
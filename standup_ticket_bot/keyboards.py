@@ -6,6 +6,7 @@ BTN_ALL = "Все концерты"
 BTN_21 = "Ближайшие 21 день"
 BTN_7 = "Ближайшие 7 дней"
 BTN_3 = "Ближайшие 3 дня"
+BUTTONS = (BTN_ALL, BTN_21, BTN_7, BTN_3)
 
 # Собираем клавиатуру
 main_kb = ReplyKeyboardMarkup(
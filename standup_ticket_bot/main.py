@@ -73,15 +73,17 @@
 
 import os
 import asyncio
-from typing import Callable
 
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 
-from standup_ticket_bot.database import init_db, AsyncSessionLocal
-from standup_ticket_bot.parsers import parse_yandex, parse_gostandup, parse_timepad
-from standup_ticket_bot.concert_repository import upsert_concert
+from standup_ticket_bot import http_client
+from standup_ticket_bot.archive import archive_old_concerts
+from standup_ticket_bot.database import init_db
+from standup_ticket_bot.ingest import refresh_sources, REFRESH_INTERVAL_MIN
 from standup_ticket_bot.handler import router as base_router
+from standup_ticket_bot.keyboards import BUTTONS
+from standup_ticket_bot.middlewares import ChatCoalesceMiddleware
 from dotenv import load_dotenv
 
 
@@ -92,31 +94,23 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN не задан в .env")
 
-PARSERS: tuple[Callable[..., list[dict]], ...] = (
-    parse_yandex,
-    parse_gostandup,  # async
-    parse_timepad,  # async
-)
 
-
-async def refresh_all_events() -> None:
+async def refresh_all_events() -> bool:
     """
-    Вызывает upsert_concert один раз, передавая все парсер-функции.
-    Любая ошибка выводится в консоль, но цикл не прерывается.
+    Обновляет все источники, каждый в своей транзакции (см. ingest.py).
+    Ошибки источников выводятся в консоль, но цикл не прерывается.
+    Возвращает True, если все источники обновились.
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            await upsert_concert(session, *PARSERS)
-            print("✓  Данные всех источников обновлены")
-        except Exception as e:
-            print("‼️  Ошибка обновления мероприятий:", e)
+    results = await refresh_sources()
+    return all(r.ok for r in results)
 
 
 async def scheduler_loop() -> None:
-    """Фоновый планировщик — каждые 5 минут."""
+    """Фоновый планировщик — раз в REFRESH_INTERVAL_MIN минут (+ архивация)."""
     while True:
         await refresh_all_events()
-        await asyncio.sleep(120 * 60)
+        await archive_old_concerts()
+        await asyncio.sleep(REFRESH_INTERVAL_MIN * 60)
 
 
 async def main() -> None:
@@ -129,20 +123,26 @@ async def main() -> None:
     # Telegram-бот
     bot = Bot(token=BOT_TOKEN)
     dp = Dispatcher()
+    # Повторные/сменённые нажатия кнопок не плодят запросы и сообщения
+    dp.message.outer_middleware(ChatCoalesceMiddleware(BUTTONS))
     dp.include_router(base_router)
 
     # /refresh — ручное обновление
     @dp.message(Command("refresh"))
     async def cmd_refresh(message):
         await message.answer("Обновляю события…")
-        await refresh_all_events()
-        await message.answer("Готово!")
+        ok = await refresh_all_events()
+        await message.answer("Готово!" if ok else "Готово, но часть источников не обновилась.")
 
     # Запускаем фоновый планировщик
-    asyncio.create_task(scheduler_loop())
-
-    # Стартуем polling
-    await dp.start_polling(bot)
+    scheduler = asyncio.create_task(scheduler_loop())
+
+    # Стартуем polling; при остановке закрываем HTTP-пулы источников
+    try:
+        await dp.start_polling(bot)
+    finally:
+        scheduler.cancel()
+        await http_client.close_sessions()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+# standup_ticket_bot/middlewares.py
+"""Middleware диспетчера."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+
+class ChatCoalesceMiddleware(BaseMiddleware):
+    """
+    Гасит повторные нажатия кнопок в одном чате:
+      • та же кнопка, пока её ответ ещё отправляется, — повтор отбрасывается
+        (пользователь получит ответ первого нажатия);
+      • та же кнопка в течение repeat_window секунд после ответа — тоже
+        отбрасывается;
+      • другая кнопка, пока отправляется предыдущий ответ, — предыдущий
+        ответ отменяется (дальше сообщения не шлются), запускается новый.
+    Сообщения с другим текстом проходят без изменений.
+    Работает, только если апдейты обрабатываются параллельно
+    (start_polling(handle_as_tasks=True) — по умолчанию).
+    """
+
+    def __init__(self, texts: Iterable[str], repeat_window: float = 3.0) -> None:
+        self.texts = frozenset(texts)
+        self.repeat_window = repeat_window
+        self._inflight: Dict[int, tuple[str, asyncio.Task]] = {}
+        self._finished: Dict[tuple[int, str], float] = {}
+
+    def _recently_answered(self, chat_id: int, text: str, now: float) -> bool:
+        if len(self._finished) > 1000:
+            self._finished = {
+                k: t for k, t in self._finished.items() if now - t < self.repeat_window
+            }
+        done_at = self._finished.get((chat_id, text))
+        return done_at is not None and now - done_at < self.repeat_window
+
+    async def __call__(
+            self,
+            handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+            event: Message,
+            data: Dict[str, Any],
+    ) -> Optional[Any]:
+        text = event.text
+        if text not in self.texts:
+            return await handler(event, data)
+
+        chat_id = event.chat.id
+        current = self._inflight.get(chat_id)
+        if current is not None and current[0] == text:
+            return None                     # тот же запрос уже выполняется
+        # Проверяем до отмены: отброшенное нажатие не должно гасить текущий ответ
+        if self._recently_answered(chat_id, text, time.monotonic()):
+            return None
+        if current is not None:
+            current[1].cancel()             # пользователь передумал — старый ответ не нужен
+
+        task = asyncio.ensure_future(handler(event, data))
+        self._inflight[chat_id] = (text, task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            superseded = self._inflight.get(chat_id, (None, None))[1] is not task
+            if task.cancelled() and superseded:
+                return None
+            raise
+        finally:
+            if self._inflight.get(chat_id, (None, None))[1] is task:
+                del self._inflight[chat_id]
+            if not task.cancelled():
+                self._finished[(chat_id, text)] = time.monotonic()
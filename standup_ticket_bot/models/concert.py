@@ -1,6 +1,6 @@
 import enum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Index, LargeBinary, Enum as SQLEnum
 from standup_ticket_bot.database import Base
 
 
@@ -10,10 +10,8 @@ class SourceEnum(enum.Enum):
     TIMEPAD = "TIMEPAD"
 
 
-class Concert(Base):
-    __tablename__ = "concerts"
-
-    id = Column(Integer, primary_key=True, index=True)
+class ConcertColumns:
+    """Общие колонки concerts и concerts_archive."""
     external_id = Column(String, index=True, nullable=False)
     name = Column(String, index=True, nullable=False)
     date = Column(DateTime, index=True, nullable=False)
@@ -21,5 +19,30 @@ class Concert(Base):
     tickets_total = Column(Integer, nullable=False)
     source = Column(SQLEnum(SourceEnum), nullable=False)
     url = Column(String, nullable=True)
+    city = Column(String, index=True, nullable=True)     # город (Yandex — из YANDEX_CITY_IDS)
+    org_id = Column(String, nullable=True)               # организация Timepad
+    sales_history = Column(LargeBinary, nullable=True)   # кольцевой буфер (время, продано), см. forecast.py
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Concert(ConcertColumns, Base):
+    """«Горячая» таблица: будущие концерты и недавно прошедшие (до архивации)."""
+    __tablename__ = "concerts"
+    __table_args__ = (
+        # upsert ищет концерт по source + external_id на каждом событии
+        Index("ix_concerts_source_external_id", "source", "external_id"),
+        # id переезжает в concerts_archive — в SQLite не даём переиспользовать
+        # id удалённых строк (без AUTOINCREMENT rowid берётся как max + 1)
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+
+class ConcertArchive(ConcertColumns, Base):
+    """Прошедшие концерты, перенесённые из concerts (id сохраняется)."""
+    __tablename__ = "concerts_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLEnum
+from standup_ticket_bot.database import Base
+from standup_ticket_bot.models.concert import SourceEnum
+
+
+class SyncState(Base):
+    """Контрольная точка загрузки: одна строка на источник."""
+    __tablename__ = "sync_state"
+
+    source = Column(SQLEnum(SourceEnum), primary_key=True)
+    last_success_at = Column(DateTime, nullable=True)   # последняя успешная синхронизация
+    last_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -11,25 +11,93 @@ from __future__ import annotations
         "tickets_total": int,
         "url": str,
         "source": SourceEnum,
+        "city": str | None,             # город (если источник его знает)
+        "org_id": str | None,           # организация Timepad
     }
+
+Несколько городов (Yandex) и организаций (Timepad) загружаются параллельно;
+общее число одновременных запросов ко всем источникам ограничено
+INGEST_CONCURRENCY.
+
+Если ответы источника не изменились с прошлого успешного цикла
+(304 или тот же хэш тела — см. http_client), парсер возвращает None:
+JSON не декодируется, даты не парсятся, в БД ничего не пишется.
 """
 
 from datetime import datetime, timezone
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Callable, Awaitable, Optional
 import time
 import hashlib
 import json
 import itertools
-import aiohttp
+import asyncio
 import os
 
 from dateutil import parser as date_parser
 from dotenv import load_dotenv
 
+from standup_ticket_bot import http_client
+from standup_ticket_bot.cutoff import upcoming_cutoff
 from standup_ticket_bot.models.concert import SourceEnum
 
 load_dotenv()
 
+# ---------------------------------------------------------------------------
+# Параллельная загрузка
+# ---------------------------------------------------------------------------
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+
+_fanout_sem: asyncio.Semaphore | None = None
+
+
+def _fanout_limit() -> asyncio.Semaphore:
+    """Общий на все источники лимит одновременных HTTP-запросов."""
+    global _fanout_sem
+    if _fanout_sem is None:
+        _fanout_sem = asyncio.Semaphore(INGEST_CONCURRENCY)
+    return _fanout_sem
+
+
+async def _get(source: SourceEnum, url: str, **kwargs: Any) -> http_client.Response:
+    """http_client.get под общим лимитом INGEST_CONCURRENCY."""
+    async with _fanout_limit():
+        return await http_client.get(source.value, url, **kwargs)
+
+
+async def _gather(*aws: Awaitable[Any]) -> List[Any]:
+    """
+    asyncio.gather, который при первой ошибке отменяет остальные задачи и
+    дожидается их: после неудачной попытки ничего не продолжает ходить в
+    источник и писать валидаторы поверх http_client.discard().
+    Наружу уходит исходное исключение (а не ExceptionGroup, как у TaskGroup).
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _merge(parts: List[Optional[List[dict]]]) -> Optional[List[dict]]:
+    """Склеивает результаты по городам/организациям; None — ничего не изменилось."""
+    if all(p is None for p in parts):
+        return None
+    return list(itertools.chain.from_iterable(p for p in parts if p))
+
+
+def _id_list(raw: str) -> List[tuple[str, str | None]]:
+    """"1,2:Москва" → [("1", None), ("2", "Москва")]."""
+    out: List[tuple[str, str | None]] = []
+    for part in raw.split(","):
+        ident, _, label = part.strip().partition(":")
+        if ident:
+            out.append((ident.strip(), label.strip() or None))
+    return out
+
+
 # ╔═══════════════════════════════════════════════════════════════════════╗
 # ║                         YANDEX AFISHA (CRM)                           ║
 # ╚═══════════════════════════════════════════════════════════════════════╝
@@ -37,6 +105,9 @@ YANDEX_API_URL = os.getenv("YANDEX_API_URL", "https://api.tickets.yandex.net/api
 YANDEX_LOGIN = os.getenv("YANDEX_API_LOGIN")
 YANDEX_PASSWORD = os.getenv("YANDEX_API_PASSWORD")
 YANDEX_CITY_ID = int(os.getenv("YANDEX_CITY_ID", "34348482"))
+# Список городов: YANDEX_CITY_IDS=34348482:Москва,12345:Санкт-Петербург
+# (название необязательно; без него в city пишется id)
+YANDEX_CITIES = _id_list(os.getenv("YANDEX_CITY_IDS") or str(YANDEX_CITY_ID))
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -53,15 +124,6 @@ def _yandex_auth() -> str:
     return f"{YANDEX_LOGIN}:{sha1}:{ts}"
 
 
-a_sync_session: aiohttp.ClientSession | None = None
-def _session() -> aiohttp.ClientSession:
-    """Single shared ClientSession (lazy)."""
-    global a_sync_session
-    if a_sync_session is None or a_sync_session.closed:
-        a_sync_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
-    return a_sync_session
-
-
 # ---------- helpers for robust json parsing ----------
 def _safe_json(raw: str):
     """Возвращает первый валидный JSON из raw.
@@ -91,25 +153,36 @@ def _safe_json(raw: str):
     raise RuntimeError(f"Non-JSON API response. Snippet: {snippet}")
 
 
-async def _yandex_call(action: str, **extra: Any) -> Dict[str, Any]:
-    """Low-level wrapper around Yandex CRM API."""
+async def _yandex_request(action: str, city_id: str, **extra: Any) -> http_client.Response:
+    """Low-level wrapper around Yandex CRM API (сырой ответ)."""
     params: Dict[str, Any] = {
         "action": action,
         "auth": _yandex_auth(),
-        "city_id": YANDEX_CITY_ID,
+        "city_id": city_id,
         "format": "json",
         **extra,
     }
     url = YANDEX_API_URL.rstrip("/") + "/"
-    async with _session().get(url, params=params) as resp:
-        raw = await resp.text()
-    data: Dict[str, Any] = _safe_json(raw)
+    # auth меняется на каждый запрос, поэтому в ключ кэша не входит
+    extra_key = hashlib.sha1(json.dumps(extra, sort_keys=True).encode()).hexdigest()
+    return await _get(
+        SourceEnum.YANDEX, url, params=params, raise_for_status=False,
+        cache_key=f"{action}:{city_id}:{extra_key}",
+    )
+
 
+def _yandex_data(action: str, resp: http_client.Response) -> Dict[str, Any]:
+    data: Dict[str, Any] = _safe_json(resp.text())
     if data.get("status") != "0":
         raise RuntimeError(f"Yandex API error {action}: {data}")
     return data
 
 
+async def _yandex_call(action: str, city_id: str, **extra: Any) -> Dict[str, Any]:
+    """Low-level wrapper around Yandex CRM API."""
+    return _yandex_data(action, await _yandex_request(action, city_id, **extra))
+
+
 def _flatten(lst: List[Any]) -> List[Any]:
     """crm.*.list иногда отдаёт список списков – расплющиваем."""
     return list(itertools.chain.from_iterable((i if isinstance(i, list) else [i]) for i in lst))
@@ -131,21 +204,53 @@ def _parse_dt(raw: str) -> datetime:
 # Public API
 # ---------------------------------------------------------------------------
 
-async def parse_yandex() -> List[dict]:
-    """Return future Yandex Afisha events with ticket stats."""
+async def parse_yandex() -> Optional[List[dict]]:
+    """Return future Yandex Afisha events with ticket stats (all YANDEX_CITIES)."""
+    per_city = await _gather(*(
+        _parse_yandex_city(city_id, label or city_id) for city_id, label in YANDEX_CITIES
+    ))
+    return _merge(per_city)
+
+
+# city_id → (хэш ответа crm.event.list, отобранные сеансы с датами)
+_yandex_events_cache: Dict[str, tuple[str, List[tuple[dict, datetime]]]] = {}
+
+
+async def _parse_yandex_city(city_id: str, city: str) -> Optional[List[dict]]:
     # 1. Сеансы (events)
-    ev_resp = await _yandex_call("crm.event.list")
-    events_raw = _flatten(ev_resp.get("result", []))
-    if not events_raw:
-        return []
+    ev_resp = await _yandex_request("crm.event.list", city_id)
+
+    # 1.1. crm.event.list не умеет фильтровать по дате, поэтому отсекаем
+    #      закрытые и прошедшие сеансы до запроса отчёта — отчёт
+    #      запрашиваем только по актуальным event_id.
+    #      Тот же ответ, что и раньше, повторно не разбираем.
+    cached = _yandex_events_cache.get(city_id)
+    if cached is not None and cached[0] == ev_resp.digest:
+        events = cached[1]
+    else:
+        events_raw = _flatten(_yandex_data("crm.event.list", ev_resp).get("result", []))
+        cutoff = upcoming_cutoff()
+        events = []
+        for ev in events_raw:
+            if ev.get("status") != 1:  # пропускаем закрытые/неактуальные сеансы
+                continue
+            dt = _parse_dt(ev.get("date", ""))
+            if dt >= cutoff:
+                events.append((ev, dt))
+        _yandex_events_cache[city_id] = (ev_resp.digest, events)
+    if not events:
+        return None if ev_resp.unchanged else []
 
     # 2. Отчёт по билетам (batched by IDs)
-    ids = ",".join(str(e["id"]) for e in events_raw)
-    rep_resp = await _yandex_call("crm.report.event", event_ids=ids)
+    ids = ",".join(str(ev["id"]) for ev, _ in events)
+    rep_resp = await _yandex_request("crm.report.event", city_id, event_ids=ids)
+    if ev_resp.unchanged and rep_resp.unchanged:
+        return None
+    rep_data = _yandex_data("crm.report.event", rep_resp)
 
     # 2.1. Собираем корректную статистику по каждому event_id
     stats: Dict[str, dict] = {}
-    for row in rep_resp.get("result", []):
+    for row in rep_data.get("result", []):
         eid = str(row["event_id"])
         sold  = row.get("tickets_sold", 0)
         avail = row.get("tickets_available", 0)
@@ -155,31 +260,21 @@ async def parse_yandex() -> List[dict]:
         s["sold"]  += sold
         s["total"] += total
 
-    # 3. Формируем итоговый список, фильтруя прошедшие
+    # 3. Формируем итоговый список
     items: List[dict] = []
-    now = datetime.utcnow()
-
-    for ev in events_raw:
-        if ev.get("status") != 1:  # пропускаем закрытые/неактуальные сеансы
-            continue
-
+    for ev, dt in events:
         eid = str(ev["id"])
-        name = ev.get("name", "").strip()
-        dt = _parse_dt(ev.get("date", ""))
-
-        # Отброс прошедших событий
-        if dt < now:
-            continue
-
         st = stats.get(eid, {"sold": 0, "total": 0})
         items.append({
             "external_id": eid,
-            "name": name,
+            "name": ev.get("name", "").strip(),
             "date": dt,
             "tickets_sold": st["sold"],
             "tickets_total": st["total"],
             "url": f"https://afisha.yandex.ru/events/{eid}",
             "source": SourceEnum.YANDEX,
+            "city": city,
+            "org_id": None,
         })
 
     return items
@@ -194,12 +289,14 @@ if not GOSTANDUP_BEARER:
     raise RuntimeError("GOSTANDUP_BEARER_TOKEN not set in .env")
 
 
-async def parse_gostandup() -> List[dict]:
+async def parse_gostandup() -> Optional[List[dict]]:
+    # API организатора не поддерживает фильтр по дате — прошедшие события
+    # отсекаются общим этапом drop_past_events().
     headers = {"Authorization": f"Bearer {GOSTANDUP_BEARER}"}
-    async with _session().get(GOSTANDUP_API_URL, headers=headers) as resp:
-        resp.raise_for_status()
-        raw = await resp.text()
-        data = _safe_json(raw)
+    resp = await _get(SourceEnum.GOSTANDUP, GOSTANDUP_API_URL, headers=headers, cache_key="events")
+    if resp.unchanged:
+        return None
+    data = _safe_json(resp.text())
 
     items: List[dict] = []
     for ev in data.get("events", []):
@@ -218,7 +315,9 @@ async def parse_gostandup() -> List[dict]:
             "tickets_sold": sold,
             "tickets_total": total,
             "url": ev.get("link") or ev.get("url") or f"https://gostandup.ru/event/{ev['id']}",
-            "source": SourceEnum.GOSTANDUP
+            "source": SourceEnum.GOSTANDUP,
+            "city": None,
+            "org_id": None,
         })
     return items
 
@@ -229,39 +328,55 @@ async def parse_gostandup() -> List[dict]:
 TIMEPAD_API_URL = os.getenv("TIMEPAD_API_URL", "https://api.timepad.ru/v1")
 TIMEPAD_BEARER = os.getenv("TIMEPAD_BEARER_TOKEN")
 TIMEPAD_ORG_ID = os.getenv("TIMEPAD_ORG_ID")
-if not (TIMEPAD_BEARER and TIMEPAD_ORG_ID):
+# Несколько организаций: TIMEPAD_ORG_IDS=123,456
+TIMEPAD_ORG_IDS = [org for org, _ in _id_list(os.getenv("TIMEPAD_ORG_IDS") or TIMEPAD_ORG_ID or "")]
+if not (TIMEPAD_BEARER and TIMEPAD_ORG_IDS):
     raise RuntimeError("TIMEPAD creds missing")
 
 
-async def fetch_registration(session: aiohttp.ClientSession, event_id: str) -> dict:
-    url = f"{TIMEPAD_API_URL}/events/{event_id}.json"
-    params = {"fields": "registration"}
-    async with session.get(url, headers={"Authorization": f"Bearer {TIMEPAD_BEARER}"}, params=params) as resp:
-        resp.raise_for_status()
-        raw = await resp.text()
-        data = _safe_json(raw)
-    places = data.get("registration", {}).get("places", [])
-    return places[0] if isinstance(places, list) and places else places or {}
+# event_id → (хэш ответа, места): разобранные регистрации прошлого цикла
+# и текущего; после цикла остаются только запрошенные в нём события
+_timepad_registrations: Dict[str, tuple[str, dict]] = {}
+_timepad_registrations_seen: Dict[str, tuple[str, dict]] = {}
 
 
-async def parse_timepad() -> List[dict]:
-    url = f"{TIMEPAD_API_URL}/events.json"
-    headers = {"Authorization": f"Bearer {TIMEPAD_BEARER}"}
-    params = {
-        "organization_ids": TIMEPAD_ORG_ID,
-        "fields": "dates,starts_at,ticket_types",
-        "limit": 100,
-        "skip": 0,
-        "sort": "+starts_at",
-    }
+async def fetch_registration(event_id: str) -> tuple[dict, bool]:
+    """Регистрация события: (места, ответ не изменился с прошлого цикла)."""
+    url = f"{TIMEPAD_API_URL}/events/{event_id}.json"
+    params = {"fields": "registration"}
+    resp = await _get(
+        SourceEnum.TIMEPAD, url,
+        headers={"Authorization": f"Bearer {TIMEPAD_BEARER}"}, params=params,
+        cache_key=f"registration:{event_id}",
+    )
+    # Тот же ответ, что и раньше, повторно не разбираем
+    cached = _timepad_registrations.get(event_id)
+    if cached is None or cached[0] != resp.digest:
+        data = _safe_json(resp.text())
+        places = data.get("registration", {}).get("places", [])
+        place = places[0] if isinstance(places, list) and places else places or {}
+        cached = (resp.digest, place)
+    _timepad_registrations_seen[event_id] = cached
+    return cached[1], resp.unchanged
+
+
+async def parse_timepad() -> Optional[List[dict]]:
+    """События всех организаций TIMEPAD_ORG_IDS."""
+    _timepad_registrations_seen.clear()
+    per_org = await _gather(*(_parse_timepad_org(org_id) for org_id in TIMEPAD_ORG_IDS))
+    # Прошедшие и снятые события из кэша выпадают
+    _timepad_registrations.clear()
+    _timepad_registrations.update(_timepad_registrations_seen)
+    return _merge(per_org)
+
+
+# org_id → (хэш ответа events.json, разобранные события)
+_timepad_events_cache: Dict[str, tuple[str, List[dict]]] = {}
+
+
+def _timepad_items(org_id: str, data: dict) -> List[dict]:
+    """Разбор events.json; у событий без ticket_types tickets_* = None."""
     items: List[dict] = []
-    session = _session()
-
-    async with session.get(url, headers=headers, params=params) as resp:
-        resp.raise_for_status()
-        raw = await resp.text()
-        data = _safe_json(raw)
-
     for ev in data.get("values", []):
         ext = str(ev.get("id"))
         name = (ev.get("name") or ev.get("title") or "").strip()
@@ -273,23 +388,69 @@ async def parse_timepad() -> List[dict]:
 
         dt = _parse_dt(raw_dt)
 
-        tt = ev.get("ticket_types", []) or []
-        if tt:
-            sold = sum((t.get("sold") or 0) for t in tt)
-            total = sum((t.get("total") or t.get("count") or 0) for t in tt)
-        else:
-            reg = await fetch_registration(session, ext)
-            sold = reg.get("registered", 0) or reg.get("count", 0)
-            total = reg.get("limit", 0) or reg.get("capacity", 0)
-
-        items.append({
+        item = {
             "external_id": ext,
             "name": name,
             "date": dt,
-            "tickets_sold": sold,
-            "tickets_total": total,
+            "tickets_sold": None,
+            "tickets_total": None,
             "url": ev.get("url") or ev.get("site_url") or f"{TIMEPAD_API_URL}/events/{ext}",
             "source": SourceEnum.TIMEPAD,
-        })
+            "city": (ev.get("location") or {}).get("city") or None,
+            "org_id": org_id,
+        }
 
+        tt = ev.get("ticket_types", []) or []
+        if tt:
+            item["tickets_sold"] = sum((t.get("sold") or 0) for t in tt)
+            item["tickets_total"] = sum((t.get("total") or t.get("count") or 0) for t in tt)
+        items.append(item)
     return items
+
+
+async def _parse_timepad_org(org_id: str) -> Optional[List[dict]]:
+    url = f"{TIMEPAD_API_URL}/events.json"
+    headers = {"Authorization": f"Bearer {TIMEPAD_BEARER}"}
+    params = {
+        "organization_ids": org_id,
+        "fields": "dates,starts_at,ticket_types,location",
+        "starts_at_min": upcoming_cutoff().strftime("%Y-%m-%dT%H:%M:%S+0000"),
+        "limit": 100,
+        "skip": 0,
+        "sort": "+starts_at",
+    }
+
+    # starts_at_min меняется каждый цикл, но ответ от этого не меняется,
+    # пока не прошло очередное событие — в ключ кэша он не входит
+    resp = await _get(SourceEnum.TIMEPAD, url, headers=headers, params=params,
+                      cache_key=f"events:{org_id}")
+    # Тот же ответ, что и раньше, повторно не разбираем
+    cached = _timepad_events_cache.get(org_id)
+    if cached is None or cached[0] != resp.digest:
+        cached = (resp.digest, _timepad_items(org_id, _safe_json(resp.text())))
+        _timepad_events_cache[org_id] = cached
+    # Копии: продажи ниже дописываются в словари событий
+    items = [dict(it) for it in cached[1]]
+    need_registration = [it for it in items if it["tickets_sold"] is None]
+
+    # Регистрации без ticket_types догружаем параллельно (под общим лимитом).
+    # Они меняются и при неизменном events.json, поэтому «без изменений» —
+    # только если не изменился ни один из ответов.
+    regs = await _gather(*(fetch_registration(it["external_id"]) for it in need_registration))
+    if resp.unchanged and all(unchanged for _, unchanged in regs):
+        return None
+    for item, (reg, _) in zip(need_registration, regs):
+        item["tickets_sold"] = reg.get("registered", 0) or reg.get("count", 0)
+        item["tickets_total"] = reg.get("limit", 0) or reg.get("capacity", 0)
+
+    return items
+
+
+# -------------------------------------------------------------------
+# Реестр источников
+# -------------------------------------------------------------------
+PARSERS_BY_SOURCE: Dict[SourceEnum, Callable[[], Awaitable[Optional[List[dict]]]]] = {
+    SourceEnum.YANDEX: parse_yandex,
+    SourceEnum.GOSTANDUP: parse_gostandup,
+    SourceEnum.TIMEPAD: parse_timepad,
+}
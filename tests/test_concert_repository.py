@@ -0,0 +1,168 @@
+# tests/test_concert_repository.py
+"""Репозиторий концертов на настоящей БД, в процессе.
+
+По умолчанию — SQLite в памяти. Тот же набор против Postgres:
+    TEST_DATABASE_URL=postgresql+asyncpg://.../standup_test python -m pytest
+(только отдельная БД — после каждого теста таблицы удаляются).
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from standup_ticket_bot import database
+from standup_ticket_bot.concert_repository import (
+    archive_concerts, observe_unchanged_sales, stream_concerts, upsert_events,
+)
+from standup_ticket_bot.models.concert import Concert, ConcertArchive, SourceEnum
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+
+def run_db(test):
+    """Выполняет async-тест test(session) на чистой БД."""
+    async def _run():
+        database.configure(TEST_DATABASE_URL, echo=False)
+        await database.init_db()
+        try:
+            async with database.AsyncSessionLocal() as session:
+                await test(session)
+        finally:
+            async with database.engine.begin() as conn:
+                await conn.run_sync(database.Base.metadata.drop_all)
+            await database.engine.dispose()
+
+    asyncio.run(_run())
+
+
+def event(external_id, days, sold=0, source=SourceEnum.TIMEPAD):
+    return {
+        "external_id": external_id,
+        "name": f"Show {external_id}",
+        "date": datetime.utcnow() + timedelta(days=days),
+        "tickets_sold": sold,
+        "tickets_total": 100,
+        "source": source,
+        "url": None,
+        "city": "Москва",
+        "org_id": None,
+    }
+
+
+async def all_concerts(session, model=Concert):
+    return (await session.execute(select(model).order_by(model.external_id))).scalars().all()
+
+
+def test_upsert_inserts_then_updates():
+    async def test(session):
+        assert await upsert_events(session, [event("1", 5, sold=10), event("2", 6)]) == 2
+        await session.commit()
+
+        # то же событие из другого источника — отдельный концерт
+        events = [event("1", 5, sold=25), event("1", 7, sold=3, source=SourceEnum.YANDEX)]
+        assert await upsert_events(session, events) == 2
+        await session.commit()
+
+        rows = await all_concerts(session)
+        assert [(c.external_id, c.source, c.tickets_sold) for c in rows] == [
+            ("1", SourceEnum.TIMEPAD, 25),
+            ("1", SourceEnum.YANDEX, 3),
+            ("2", SourceEnum.TIMEPAD, 0),
+        ]
+        # два наблюдения (вставка + обновление) по 8 байт
+        assert len(rows[0].sales_history) == 16
+
+    run_db(test)
+
+
+def test_upsert_skips_past_and_merges_duplicates():
+    async def test(session):
+        events = [event("old", -1), event("1", 5, sold=1), event("1", 5, sold=2)]
+        assert await upsert_events(session, events) == 2
+        await session.commit()
+
+        rows = await all_concerts(session)
+        assert [(c.external_id, c.tickets_sold) for c in rows] == [("1", 2)]
+
+    run_db(test)
+
+
+def test_unchanged_cycle_still_records_sales():
+    async def test(session):
+        await upsert_events(session, [event("1", 5, sold=10), event("2", 5, sold=4), event("old", -1)])
+        session.add(Concert(**event("yandex", 5, source=SourceEnum.YANDEX)))
+        await session.commit()
+
+        # «1» пришёл в этом цикле (наблюдение уже дописал upsert), «2» — нет
+        assert await observe_unchanged_sales(session, SourceEnum.TIMEPAD, seen=["1"]) == 1
+        await session.commit()
+
+        rows = {c.external_id: c for c in await all_concerts(session)}
+        assert len(rows["1"].sales_history) == 8
+        assert len(rows["2"].sales_history) == 16
+        assert rows["yandex"].sales_history is None
+
+    run_db(test)
+
+
+def test_archive_moves_past_concerts_and_keeps_ids():
+    async def test(session):
+        session.add_all([Concert(**event("past", -40)), Concert(**event("future", 5))])
+        await session.commit()
+        past_id = {c.external_id: c.id for c in await all_concerts(session)}["past"]
+
+        moved = await archive_concerts(session, before=datetime.utcnow() - timedelta(days=30))
+        assert moved == 1
+        assert [c.external_id for c in await all_concerts(session)] == ["future"]
+        archived = await all_concerts(session, ConcertArchive)
+        assert [(c.id, c.external_id) for c in archived] == [(past_id, "past")]
+
+    run_db(test)
+
+
+def test_archive_does_not_reuse_ids():
+    async def test(session):
+        before = datetime.utcnow() - timedelta(days=30)
+        for ext in ("a", "b"):
+            session.add(Concert(**event(ext, -40)))
+            await session.commit()
+            assert await archive_concerts(session, before=before) == 1
+
+        assert len(await all_concerts(session, ConcertArchive)) == 2
+
+    run_db(test)
+
+
+def test_archive_filters_by_external_id():
+    async def test(session):
+        session.add_all([Concert(**event("bench-1", -40)), Concert(**event("real-1", -40))])
+        await session.commit()
+
+        before = datetime.utcnow()
+        assert await archive_concerts(session, before=before, external_id_like="bench-%") == 1
+        assert [c.external_id for c in await all_concerts(session)] == ["real-1"]
+
+    run_db(test)
+
+
+def test_stream_concerts_reads_hot_and_archive_tables():
+    async def test(session):
+        session.add_all([
+            Concert(**event("archived", -40)),
+            Concert(**event("past", -2, source=SourceEnum.YANDEX)),
+            Concert(**event("future", 5)),
+        ])
+        await session.commit()
+        await archive_concerts(session, before=datetime.utcnow() - timedelta(days=30))
+
+        async def names(**kw):
+            return [row[-2] async for row in stream_concerts(session, batch_size=2, **kw)]
+
+        assert await names(when="future") == ["future"]
+        assert await names(when="past") == ["archived", "past"]
+        assert await names(when="all") == ["archived", "past", "future"]
+        assert await names(when="all", source=SourceEnum.TIMEPAD) == ["archived", "future"]
+
+    run_db(test)
@@ -0,0 +1,54 @@
+# tests/test_forecast.py
+"""Прогноз итоговых продаж (forecast.project_sold)."""
+
+import math
+from datetime import datetime, timedelta
+
+from standup_ticket_bot.forecast import append_observation, project_sold
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def history(points):
+    """points: [(часов назад, продано), ...] → буфер sales_history."""
+    buf = None
+    for hours_ago, sold in points:
+        buf = append_observation(buf, NOW - timedelta(hours=hours_ago), sold)
+    return buf
+
+
+def project(points, hours_left=10, total=1000):
+    sold_now = points[-1][1]
+    [value] = project_sold([history(points)], [NOW + timedelta(hours=hours_left)],
+                           [sold_now], [total], now=NOW)
+    return value
+
+
+def test_known_slope_is_extended_to_concert_date():
+    # 5 билетов в час последние 10 часов, до концерта ещё 10 часов
+    points = [(10 - h, 50 + 5 * h) for h in range(11)]
+    assert math.isclose(project(points), 100 + 5 * 10)
+
+
+def test_stalled_sales_project_no_growth():
+    points = [(10 - h, 100) for h in range(11)]
+    assert math.isclose(project(points), 100)
+
+
+def test_stall_after_growth_pulls_rate_down():
+    rising = [(30 - h, 5 * h) for h in range(7)]           # рост 5 билетов/час
+    flat = [(24 - h, 30) for h in range(1, 25)]            # сутки без продаж
+    assert math.isclose(project([(h - 24, s) for h, s in rising]), 30 + 5 * 10)
+    # без наблюдений за сутки простоя прогноз тянул бы рост дальше
+    assert project(rising + flat) < 30 + 1 * 10
+
+
+def test_projection_capped_by_capacity():
+    points = [(10 - h, 50 + 5 * h) for h in range(11)]
+    assert math.isclose(project(points, hours_left=1000, total=200), 200)
+
+
+def test_no_forecast_without_enough_history():
+    assert math.isnan(project([(1, 10), (0, 12)]))        # меньше FORECAST_MIN_SPAN_HOURS
+    assert math.isnan(project([(0, 12)]))
+    assert math.isnan(project([(10, 0), (0, 12)], total=0))
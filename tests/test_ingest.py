@@ -0,0 +1,131 @@
+# tests/test_ingest.py
+"""Цикл загрузки (ingest.refresh_sources) с подменёнными парсерами."""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+# parsers (его импортирует ingest) требует учётные данные уже при импорте
+for var in ("GOSTANDUP_BEARER_TOKEN", "TIMEPAD_BEARER_TOKEN", "TIMEPAD_ORG_IDS"):
+    os.environ.setdefault(var, "test")
+
+from standup_ticket_bot import database, ingest  # noqa: E402
+from standup_ticket_bot.models.concert import Concert, SourceEnum  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+EVENTS_PER_SOURCE = 20
+
+
+def fake_parser(source, rounds):
+    """Парсер, который на i-м вызове отдаёт rounds[i] (None — «не изменилось»)."""
+    calls = iter(rounds)
+    date = datetime.utcnow() + timedelta(days=5)
+
+    async def parse():
+        sold = next(calls)
+        await asyncio.sleep(0)
+        if sold is None:
+            return None
+        return [
+            {
+                "external_id": str(i),
+                "name": f"{source.value} {i}",
+                "date": date + timedelta(hours=i),
+                "tickets_sold": sold + i,
+                "tickets_total": 100,
+                "source": source,
+                "url": None,
+                "city": None,
+                "org_id": None,
+            }
+            for i in range(EVENTS_PER_SOURCE)
+        ]
+    return parse
+
+
+def run_cycles(cycles):
+    """Выполняет refresh_sources() cycles раз на чистой БД; возвращает (итоги, концерты)."""
+    async def run():
+        database.configure(TEST_DATABASE_URL, echo=False)
+        await database.init_db()
+        try:
+            results = [await ingest.refresh_sources() for _ in range(cycles)]
+            async with database.AsyncSessionLocal() as session:
+                rows = (await session.execute(select(Concert))).scalars().all()
+        finally:
+            async with database.engine.begin() as conn:
+                await conn.run_sync(database.Base.metadata.drop_all)
+            await database.engine.dispose()
+        return results, rows
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Подменяет парсеры: sources({SourceEnum: [ответ цикла 1, ...]})."""
+    monkeypatch.setattr(ingest, "INGEST_RETRIES", 1)
+    monkeypatch.setattr(ingest, "_breakers", {s: ingest.CircuitBreaker() for s in SourceEnum})
+
+    def install(rounds_by_source):
+        for source, rounds in rounds_by_source.items():
+            monkeypatch.setitem(ingest.PARSERS_BY_SOURCE, source, fake_parser(source, rounds))
+    return install
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_unchanged_source_still_gets_observations(sources):
+    # Второй цикл: два источника изменились, один ответил «без изменений»
+    sources({
+        SourceEnum.YANDEX: [1, 2],
+        SourceEnum.GOSTANDUP: [1, 5],
+        SourceEnum.TIMEPAD: [3, None],
+    })
+    results, rows = run_cycles(2)
+
+    assert all(r.ok for cycle in results for r in cycle)
+    assert len(rows) == 3 * EVENTS_PER_SOURCE
+    # у каждого концерта по наблюдению за цикл
+    assert {len(c.sales_history) for c in rows} == {16}
+    sold = {(c.source, c.external_id): c.tickets_sold for c in rows}
+    assert sold[(SourceEnum.GOSTANDUP, "0")] == 5
+    assert sold[(SourceEnum.TIMEPAD, "0")] == 3
+
+
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_failed_source_does_not_touch_other_transactions(sources, monkeypatch):
+    sources({s: [1] for s in SourceEnum})
+
+    # Все источники держат записанные, но не закоммиченные концерты;
+    # TIMEPAD падает. Его rollback не должен стереть чужие данные, а чужой
+    # commit — сохранить его. Ждём остальных не дольше 0.2 с: при
+    # последовательном доступе к БД они сюда одновременно не попадут.
+    mark_sync = ingest.mark_sync
+    arrived = []
+
+    async def mark_sync_together(session, source, error=None):
+        arrived.append(source)
+        for _ in range(20):
+            if len(arrived) == len(SourceEnum):
+                break
+            await asyncio.sleep(0.01)
+        if source is SourceEnum.TIMEPAD and error is None:
+            raise RuntimeError("upstream broke mid-cycle")
+        await asyncio.sleep(0.01)
+        await mark_sync(session, source, error=error)
+
+    monkeypatch.setattr(ingest, "mark_sync", mark_sync_together)
+    [results], rows = run_cycles(1)
+
+    assert {r.source: r.ok for r in results} == {
+        SourceEnum.YANDEX: True, SourceEnum.GOSTANDUP: True, SourceEnum.TIMEPAD: False,
+    }
+    per_source = {s: sum(c.source is s for c in rows) for s in SourceEnum}
+    assert per_source == {
+        SourceEnum.YANDEX: EVENTS_PER_SOURCE,
+        SourceEnum.GOSTANDUP: EVENTS_PER_SOURCE,
+        SourceEnum.TIMEPAD: 0,
+    }